@@ -12,7 +12,11 @@ from homeassistant.helpers.typing import ConfigType
 from homeassistant.config_entries import ConfigEntry
 from homeassistant.core import HomeAssistant
 from homeassistant.const import Platform
-from .const import DOMAIN
+from homeassistant.helpers.storage import Store
+from .api import async_remove_request_scheduler
+from .const import DOMAIN, STORAGE_VERSION
+from .services import async_setup_services
+from .usage import remove_usage
 import logging
 
 # The domain of your component. Should be equal to the name of your component.
@@ -21,6 +25,12 @@ DOMAIN = "powershaper_monitor" # TODO: test I can get rid of this because it's p
 _LOGGER = logging.getLogger(__name__)
 
 
+async def async_setup(hass: HomeAssistant, config: ConfigType) -> bool:
+    """Set up the services of the Powershaper integration."""
+    async_setup_services(hass)
+    return True
+
+
 async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry):
     """Set up the Powershaper platform."""
 
@@ -41,8 +51,25 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry):
 async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     """Unload a config entry."""
     _LOGGER.debug(f"Unloading entry: {entry.entry_id}")
+
+    # stop a backfill that is still running
+    backfill_task = hass.data[DOMAIN].get(entry.entry_id, {}).get("backfill_task")
+    if backfill_task is not None and not backfill_task.done():
+        backfill_task.cancel()
+
     unload_ok = await hass.config_entries.async_unload_platforms(entry, Platform.SENSOR)
     if unload_ok:
         hass.data[DOMAIN].pop(entry.entry_id)
+        # the request budget of the token goes with the last loaded entry using it
+        api_token = entry.data['api_token']
+        if not any(other.data['api_token'] == api_token for other in hass.config_entries.async_entries(DOMAIN)
+                   if other.entry_id in hass.data[DOMAIN]):
+            async_remove_request_scheduler(hass, api_token)
 
     return unload_ok
+
+
+async def async_remove_entry(hass: HomeAssistant, entry: ConfigEntry) -> None:
+    """Remove the data stored for a config entry."""
+    await Store(hass, STORAGE_VERSION, f"{DOMAIN}.{entry.entry_id}").async_remove()
+    await hass.async_add_executor_job(remove_usage, hass, entry.entry_id)
@@ -0,0 +1,380 @@
+"""
+api.py - rate limited, retrying and coalesced requests to the Powershaper API, shared per API token
+
+Authored by Robert Sahakyan
+"""
+
+import asyncio
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+import logging
+import random
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Hashable
+from aiohttp import ClientResponse, ClientSession, ClientTimeout, TCPConnector, hdrs
+from aiohttp.client_exceptions import ClientError
+from aiohttp.compression_utils import HAS_BROTLI
+from homeassistant import exceptions
+from homeassistant.const import EVENT_HOMEASSISTANT_CLOSE
+from homeassistant.helpers.aiohttp_client import SERVER_SOFTWARE
+from homeassistant.util import ssl as ssl_util
+from .const import (DOMAIN,
+                    DATA_SHARED,
+                    API_CONNECTION_LIMIT,
+                    API_KEEPALIVE_TIMEOUT,
+                    REQUEST_BUDGET_PER_MINUTE,
+                    REQUEST_BURST,
+                    REQUEST_MAX_RETRIES,
+                    REQUEST_BACKOFF_BASE,
+                    REQUEST_BACKOFF_MAX,
+                    REQUEST_QUOTA_PAUSE,
+                    REQUEST_TIMEOUT,
+                    REQUEST_CONNECT_TIMEOUT,
+                    REQUEST_READ_TIMEOUT,
+                    QUOTA_STATUSES)
+from .metrics import RequestMetrics
+
+_LOGGER = logging.getLogger(__name__)
+
+# every request gives up after REQUEST_TIMEOUT, or sooner if the API stops answering
+API_TIMEOUT = ClientTimeout(total=REQUEST_TIMEOUT, connect=REQUEST_CONNECT_TIMEOUT, sock_read=REQUEST_READ_TIMEOUT)
+# series compress well, brotli is only asked for when aiohttp is able to decode it
+ACCEPT_ENCODING = "gzip, deflate, br" if HAS_BROTLI else "gzip, deflate"
+
+
+class QuotaExceeded(exceptions.HomeAssistantError):
+    """Call rate quota exceeded."""
+
+
+class ApiError(exceptions.HomeAssistantError):
+    """Error response from the Powershaper API."""
+
+    def __init__(self, status: int, url: str):
+        """Initialize the error with the status of the response."""
+        super().__init__(f"Powershaper API responded with status {status} for {url}")
+        self.status = status
+
+
+def response_size(response: ClientResponse) -> int:
+    """Return the size of a response body on the wire, compressed if it was sent compressed.
+
+    That is its Content-Length, without one (a chunked response) the size read from it is used instead,
+    which is the decoded size if the response is compressed as well.
+    """
+    if response.content_length is not None:
+        return response.content_length
+    return response.content.total_bytes
+
+
+def async_get_api_session(hass) -> ClientSession:
+    """Return the session every request of the integration goes through, closed when Home Assistant stops.
+
+    It has its own pool of keep-alive connections, rather than sharing the one of every other integration,
+    and asks for compressed responses.
+    """
+    shared_data = hass.data.setdefault(DATA_SHARED, {})
+
+    if "api_session" not in shared_data:
+        connector = TCPConnector(limit=API_CONNECTION_LIMIT, keepalive_timeout=API_KEEPALIVE_TIMEOUT,
+                                 ssl=ssl_util.get_default_context())
+        session = ClientSession(connector=connector, timeout=API_TIMEOUT,
+                                headers={hdrs.USER_AGENT: SERVER_SOFTWARE, hdrs.ACCEPT_ENCODING: ACCEPT_ENCODING})
+
+        async def async_close_session(event) -> None:
+            await session.close()
+
+        hass.bus.async_listen_once(EVENT_HOMEASSISTANT_CLOSE, async_close_session)
+        shared_data["api_session"] = session
+
+    return shared_data["api_session"]
+
+
+class SharedStream:
+    """The items of one in-flight stream, replayed to every consumer that joins it while it runs.
+
+    The stream is read by a task of its own, cancelled if every consumer leaves before it is done.
+    The items are kept until it is done, so late consumers get them from the start.
+    """
+
+    def __init__(self, hass, job: Callable[[], AsyncIterator[Any]], name: str):
+        """Start reading the stream of a job."""
+        self.items = []
+        self.done = False
+        self.error = None
+        self.consumers = 0
+        self._updated = asyncio.Event()
+        self.task = hass.async_create_background_task(self._async_run(job), name)
+
+    def _notify(self) -> None:
+        """Wake the consumers waiting for a new item or the end of the stream."""
+        self._updated.set()
+        self._updated = asyncio.Event()
+
+    async def _async_run(self, job: Callable[[], AsyncIterator[Any]]) -> None:
+        """Read the stream, keeping its items and how it ended."""
+        try:
+            async for item in job():
+                self.items.append(item)
+                self._notify()
+        except (Exception, asyncio.CancelledError) as error:
+            # raised in every consumer rather than here
+            self.error = error
+        finally:
+            self.done = True
+            self._notify()
+
+    async def async_iter(self) -> AsyncIterator[Any]:
+        """Yield every item of the stream, from the first one, raising the error it failed with, if any."""
+        self.consumers += 1
+        index = 0
+        try:
+            while True:
+                if index < len(self.items):
+                    index += 1
+                    yield self.items[index - 1]
+                elif self.done:
+                    if self.error is not None:
+                        raise self.error
+                    return
+                else:
+                    await self._updated.wait()
+        finally:
+            self.consumers -= 1
+            if not self.consumers and not self.done:
+                self.task.cancel()
+
+
+class _RetryableError(Exception):
+    """A failed attempt that is worth retrying after a delay."""
+
+    def __init__(self, error: Exception, delay: float = None):
+        """Initialize with the underlying error and, if the API asked for one, the delay to wait."""
+        super().__init__(str(error))
+        self.error = error
+        self.delay = delay
+
+
+def parse_retry_after(value) -> float:
+    """Return the number of seconds of a Retry-After header (seconds or an HTTP date), None if absent or invalid."""
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max((retry_at - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+
+class TokenBucket:
+    """A request budget: capacity requests at once, refilled at rate requests per second.
+
+    Callers wait in order for a token, so requests are queued rather than dropped.
+    """
+
+    def __init__(self, rate: float, capacity: int):
+        """Initialize a full bucket."""
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def pause(self, seconds: float) -> None:
+        """Stop handing out tokens for a number of seconds, e.g. when the API reports the quota is exceeded."""
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        self.tokens = 0.0
+
+    async def async_acquire(self) -> None:
+        """Wait for a token."""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class RequestScheduler:
+    """Sends the requests of one API token within its request budget, retrying throttled and transient failures.
+
+    HTTP 426/429 pause the whole budget for the Retry-After time, 5xx responses, timeouts and
+    connection errors are retried with jittered exponential backoff, up to REQUEST_MAX_RETRIES times.
+    """
+
+    def __init__(self, hass, api_token: str):
+        """Initialize the scheduler of an API token."""
+        self.hass = hass
+        self.api_token = api_token
+        self.bucket = TokenBucket(REQUEST_BUDGET_PER_MINUTE / 60, REQUEST_BURST)
+        self.timeout = API_TIMEOUT
+        self.metrics = RequestMetrics()
+        # streams in flight, by key, see async_shared_stream
+        self.in_flight = {}
+
+    @property
+    def headers(self) -> dict[str, str]:
+        """Return the headers sent with every request."""
+        return {
+            'Authorization': f'Token {self.api_token}',
+            'Content-Type': 'application/json'
+        }
+
+    def _async_join(self, key: Hashable, job: Callable[[], AsyncIterator[Any]], url: str) -> SharedStream:
+        """Return the stream in flight for a key, started from job if there is none."""
+        shared = self.in_flight.get(key)
+        if shared is not None and not shared.done:
+            self.metrics.record_coalesced()
+            _LOGGER.debug(f"Joining the request to {url} already in flight")
+            return shared
+
+        shared = SharedStream(self.hass, job, f"{DOMAIN} request {url}")
+        self.in_flight[key] = shared
+
+        def forget(_) -> None:
+            if self.in_flight.get(key) is shared:
+                del self.in_flight[key]
+
+        shared.task.add_done_callback(forget)
+        return shared
+
+    async def async_shared_request(self, key: Hashable, url: str,
+                                   handler: Callable[[ClientResponse], Awaitable[Any]]) -> Any:
+        """Like async_request, but concurrent calls with the same key share a single request and its result.
+
+        The key has to identify what handler reads, as well as the url.
+        """
+        async def async_result():
+            yield await self.async_request(url, handler)
+
+        items = self._async_join(key, async_result, url).async_iter()
+        try:
+            return await anext(items)
+        finally:
+            await items.aclose()
+
+    async def async_shared_stream(self, key: Hashable, url: str,
+                                  iter_response: Callable[[ClientResponse], AsyncIterator[Any]]) -> AsyncIterator[Any]:
+        """Like async_stream, but concurrent calls with the same key share a single download and its items.
+
+        The key has to identify what iter_response decodes, as well as the url. Items are shared between the
+        consumers, who must not modify them.
+        """
+        items = self._async_join(key, lambda: self.async_stream(url, iter_response), url).async_iter()
+        try:
+            async for item in items:
+                yield item
+        finally:
+            await items.aclose()
+
+    def _check_response(self, response: ClientResponse, url: str) -> None:
+        """Raise for a response that is not a success, as retryable when it is worth another attempt."""
+        if response.status in QUOTA_STATUSES:
+            delay = parse_retry_after(response.headers.get('Retry-After'))
+            self.bucket.pause(REQUEST_QUOTA_PAUSE if delay is None else delay)
+            raise _RetryableError(QuotaExceeded(
+                f"Call rate quota exceeded, response status: {response.status}"), delay)
+
+        if response.status >= 500:
+            raise _RetryableError(ApiError(response.status, url))
+
+        if response.status != 200:
+            raise ApiError(response.status, url)
+
+    async def _async_backoff(self, attempt: int, retry: _RetryableError, url: str,
+                             max_retries: int = REQUEST_MAX_RETRIES) -> None:
+        """Wait before the next attempt, or give up with the underlying error after the last one."""
+        if attempt >= max_retries:
+            raise retry.error
+
+        delay = retry.delay
+        if delay is None:
+            # full jitter, so retries of concurrent requests spread out
+            delay = random.uniform(0, min(REQUEST_BACKOFF_MAX, REQUEST_BACKOFF_BASE * 2 ** attempt))
+
+        _LOGGER.debug(
+            f"Retrying {url} in {delay:.1f}s after attempt {attempt + 1} failed: {retry}")
+        await asyncio.sleep(delay)
+
+    async def async_request(self, url: str, handler: Callable[[ClientResponse], Awaitable[Any]],
+                            max_retries: int = REQUEST_MAX_RETRIES) -> Any:
+        """Send a GET request within the budget and return what handler reads from the successful response."""
+        session = async_get_api_session(self.hass)
+
+        for attempt in range(max_retries + 1):
+            await self.bucket.async_acquire()
+            start = time.monotonic()
+            try:
+                async with session.get(url, headers=self.headers, timeout=self.timeout) as response:
+                    self.metrics.record_response(response.status, time.monotonic() - start)
+                    try:
+                        self._check_response(response, url)
+                        return await handler(response)
+                    finally:
+                        self.metrics.record_bytes(response_size(response), response.content.total_bytes)
+            except _RetryableError as retry:
+                await self._async_backoff(attempt, retry, url, max_retries)
+            except (ClientError, asyncio.TimeoutError) as error:
+                self.metrics.record_failure()
+                await self._async_backoff(attempt, _RetryableError(error), url, max_retries)
+
+    async def async_stream(self, url: str, iter_response: Callable[[ClientResponse], AsyncIterator[Any]]) -> AsyncIterator[Any]:
+        """Send a GET request within the budget and yield what iter_response decodes from the successful response.
+
+        A download that fails part way is retried from the start with a new call to iter_response,
+        so the items yielded may repeat ones already yielded.
+        """
+        session = async_get_api_session(self.hass)
+
+        for attempt in range(REQUEST_MAX_RETRIES + 1):
+            await self.bucket.async_acquire()
+            start = time.monotonic()
+            try:
+                async with session.get(url, headers=self.headers, timeout=self.timeout) as response:
+                    self.metrics.record_response(response.status, time.monotonic() - start)
+                    try:
+                        self._check_response(response, url)
+                        async for item in iter_response(response):
+                            yield item
+                    finally:
+                        self.metrics.record_bytes(response_size(response), response.content.total_bytes)
+                return
+            except _RetryableError as retry:
+                await self._async_backoff(attempt, retry, url)
+            except (ClientError, asyncio.TimeoutError) as error:
+                self.metrics.record_failure()
+                await self._async_backoff(attempt, _RetryableError(error), url)
+
+
+def async_get_request_scheduler(hass, api_token: str, keep: bool = True) -> RequestScheduler:
+    """Return the request scheduler shared by every config entry and sensor using an API token.
+
+    Without keep, e.g. for a token that is only being validated, a new scheduler is not kept for later.
+    """
+    schedulers = hass.data.setdefault(DATA_SHARED, {}).setdefault("request_schedulers", {})
+
+    if api_token in schedulers:
+        return schedulers[api_token]
+
+    scheduler = RequestScheduler(hass, api_token)
+    if keep:
+        schedulers[api_token] = scheduler
+    return scheduler
+
+
+def async_remove_request_scheduler(hass, api_token: str) -> None:
+    """Forget the request scheduler of an API token, once no config entry uses it any more."""
+    hass.data.get(DATA_SHARED, {}).get("request_schedulers", {}).pop(api_token, None)
@@ -0,0 +1,7 @@
+"""
+Benchmarks for the Powershaper custom component.
+
+Run with: pytest benchmarks -s
+
+Authored by Robert Sahakyan
+"""
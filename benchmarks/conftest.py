@@ -0,0 +1,39 @@
+"""
+Fixtures for the Powershaper benchmarks.
+
+Authored by Robert Sahakyan
+"""
+import logging
+import pytest
+import pytest_asyncio
+from .harness import IntegrationHarness
+from .stand_in import PowershaperStandIn
+
+
+@pytest.fixture(autouse=True)
+def quiet_sql_logging():
+    """Keep the test plugin from logging every statement of the recorder, which would dominate the timings."""
+    logger = logging.getLogger("sqlalchemy.engine")
+    level = logger.level
+    logger.setLevel(logging.WARNING)
+    yield
+    logger.setLevel(level)
+
+
+@pytest_asyncio.fixture
+async def stand_in(socket_enabled):
+    """A running Powershaper API stand-in with five years of hourly data, on a local socket."""
+    server = PowershaperStandIn(years=5)
+    await server.start()
+    yield server
+    await server.stop()
+
+
+@pytest_asyncio.fixture
+async def harness(recorder_mock, hass, stand_in, monkeypatch, tmp_path):
+    """The integration pointed at the API stand-in, with a recorder to import into and a config directory of its own."""
+    # the response cache and usage index are kept in the config directory, the test plugin's is shared between runs
+    hass.config.config_dir = str(tmp_path)
+    harness = IntegrationHarness(hass, stand_in, monkeypatch)
+    yield harness
+    await harness.async_unload()
@@ -0,0 +1,168 @@
+"""
+Helpers to drive the integration against the API stand-in and measure what it costs.
+
+Authored by Robert Sahakyan
+"""
+import asyncio
+from dataclasses import dataclass, field
+import resource
+import time
+import tracemalloc
+from pytest_homeassistant_custom_component.common import MockConfigEntry
+from pytest_homeassistant_custom_component.components.recorder.common import async_wait_recording_done
+from .. import coordinator, meter_cache, sensor
+from ..const import DOMAIN
+from .stand_in import METER_PATH, METERS_PATH
+
+API_TOKEN = "0" * 40
+
+# event loop lag (seconds) that imports should stay below, measured at the 99th percentile
+LOOP_LAG_TARGET = 0.1
+LOOP_LAG_INTERVAL = 0.01
+
+
+class LoopLagProbe:
+    """Measure how late the event loop wakes a task that sleeps in short intervals."""
+
+    def __init__(self):
+        """Initialize the probe."""
+        self.lags = []
+        self._task = None
+
+    async def _async_probe(self) -> None:
+        """Sleep repeatedly, recording how much later than asked each sleep ended."""
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(LOOP_LAG_INTERVAL)
+            self.lags.append(loop.time() - start - LOOP_LAG_INTERVAL)
+
+    def start(self) -> None:
+        """Start probing."""
+        self._task = asyncio.get_running_loop().create_task(self._async_probe())
+
+    def stop(self) -> tuple[float, float]:
+        """Stop probing and return the maximum and 99th percentile lag."""
+        self._task.cancel()
+        if not self.lags:
+            return 0.0, 0.0
+        lags = sorted(self.lags)
+        return lags[-1], lags[int(len(lags) * 0.99)]
+
+
+@dataclass
+class Measurement:
+    """What a benchmark scenario cost."""
+
+    name: str
+    wall_time: float = 0.0
+    peak_rss_mb: float = 0.0
+    peak_python_mb: float = 0.0
+    api_calls: int = 0
+    bytes_received: int = 0
+    points_imported: int = 0
+    loop_lag_max: float = 0.0
+    loop_lag_p99: float = 0.0
+    extra: dict = field(default_factory=dict)
+
+    @property
+    def points_per_second(self) -> float:
+        """Return the import throughput of the scenario."""
+        return self.points_imported / self.wall_time if self.wall_time else 0.0
+
+    def report(self) -> str:
+        """Return a one line summary of the measurement."""
+        extra = "".join(f" | {key}: {value}" for key, value in self.extra.items())
+        return (f"{self.name}: {self.wall_time:.2f} s | peak RSS {self.peak_rss_mb:.0f} MB"
+                f" | peak python {self.peak_python_mb:.1f} MB | {self.api_calls} API calls"
+                f" | {self.bytes_received / 1024:.0f} KiB | {self.points_imported} points"
+                f" ({self.points_per_second:.0f}/s) | loop lag p99 {self.loop_lag_p99 * 1000:.0f} ms"
+                f" max {self.loop_lag_max * 1000:.0f} ms{extra}")
+
+
+class IntegrationHarness:
+    """Point the integration at the stand-in, set up a config entry and count the statistics it imports."""
+
+    def __init__(self, hass, stand_in, monkeypatch):
+        """Initialize the harness and redirect the API urls to the stand-in."""
+        self.hass = hass
+        self.stand_in = stand_in
+        self.entries = []
+        self.entities = []
+        self.points_imported = 0
+        self.setup_time = None
+
+        monkeypatch.setattr(meter_cache, "POWERSHAPER_AUTH_URL",
+                            stand_in.url + METERS_PATH)
+        monkeypatch.setattr(coordinator, "POWERSHAPER_BASE_SENSOR_URL",
+                            stand_in.url + METER_PATH)
+
+        import_statistics = coordinator.async_import_statistics
+
+        def counting_import_statistics(hass, metadata, statistics):
+            self.points_imported += len(statistics)
+            import_statistics(hass, metadata, statistics)
+
+        monkeypatch.setattr(coordinator, "async_import_statistics",
+                            counting_import_statistics)
+
+    @property
+    def coordinator(self):
+        """Return the coordinator of the config entry."""
+        return self.entities[0].coordinator
+
+    async def async_setup_entry(self) -> None:
+        """Set up the sensor platform of a config entry, as Home Assistant does on start, and wait for its backfill."""
+        entry = MockConfigEntry(domain=DOMAIN, data={"api_token": API_TOKEN})
+        entry.add_to_hass(self.hass)
+        self.entries.append(entry)
+        start = time.perf_counter()
+        await sensor.async_setup_entry(self.hass, entry, self.entities.extend)
+        self.setup_time = time.perf_counter() - start
+        # the backfill runs in the background, wait for it so it is part of the measurement,
+        # and for the recorder, so the scenarios measured after it do not pay for its statistics
+        await self.hass.data[DOMAIN][entry.entry_id]["backfill_task"]
+        await self.hass.async_block_till_done()
+        await async_wait_recording_done(self.hass)
+
+    async def async_unload(self) -> None:
+        """Stop the timers and background tasks of the config entries set up, as unloading them does."""
+        for entry in self.entries:
+            await entry._async_process_on_unload(self.hass)
+
+    async def async_poll(self) -> None:
+        """Run an update cycle with every meter due, regardless of its poll schedule."""
+        for meter in self.coordinator.meters:
+            meter.next_poll = None
+        await self.coordinator.async_refresh()
+
+    async def async_measure(self, name, scenario) -> Measurement:
+        """Run a scenario coroutine function and measure it until the recorder has committed its statistics."""
+        self.stand_in.reset_counters()
+        self.points_imported = 0
+        probe = LoopLagProbe()
+        tracemalloc.start()
+        start = time.perf_counter()
+        probe.start()
+
+        await scenario()
+        await self.hass.async_block_till_done()
+        await async_wait_recording_done(self.hass)
+
+        loop_lag_max, loop_lag_p99 = probe.stop()
+        wall_time = time.perf_counter() - start
+        _, peak_python = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        return Measurement(
+            name=name,
+            wall_time=wall_time,
+            peak_rss_mb=resource.getrusage(
+                resource.RUSAGE_SELF).ru_maxrss / 1024,
+            peak_python_mb=peak_python / 1024 / 1024,
+            api_calls=self.stand_in.total_calls,
+            bytes_received=self.stand_in.bytes_sent,
+            points_imported=self.points_imported,
+            loop_lag_max=loop_lag_max,
+            loop_lag_p99=loop_lag_p99,
+        )
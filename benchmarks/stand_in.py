@@ -0,0 +1,177 @@
+"""
+A local stand-in for the Powershaper API, serving generated multi-year hourly series.
+
+Authored by Robert Sahakyan
+"""
+import asyncio
+from collections import defaultdict, deque
+from datetime import date, datetime, timedelta, timezone
+import gzip
+import json
+import math
+import random
+from aiohttp import web
+
+CONSENT_UUID = "{:08x}-0000-4000-8000-000000000000"
+METERS_PATH = "/meters/api/v1/meters/"
+METER_PATH = "/meters/api/v1/meter/"
+
+
+def generate_point(meter_type: str, hour: datetime) -> dict:
+    """Return a realistic data point for a meter at a given hour: a daily profile, seasonality and noise."""
+    noise = random.Random(hash((meter_type, hour.timestamp()))).random()
+    day_of_year = hour.timetuple().tm_yday
+    winter = 1 + 0.6 * math.cos(2 * math.pi * day_of_year / 365)
+
+    if meter_type == "gas":
+        heating = 1.5 if hour.hour in (6, 7, 8, 17, 18, 19, 20, 21) else 0.2
+        energy_kwh = round(heating * winter * (0.5 + noise), 3)
+        carbon_kg = round(energy_kwh * 0.184, 3)
+    else:
+        base = 0.15 + 0.35 * math.exp(-((hour.hour - 19) ** 2) / 8)
+        energy_kwh = round(base * (0.7 + 0.6 * noise), 3)
+        carbon_kg = round(energy_kwh * (0.15 + 0.1 * winter), 3)
+
+    return {
+        "time": hour.strftime('%Y-%m-%dT%H:%M:%SZ'),
+        "energy_kwh": energy_kwh,
+        "carbon_kg": carbon_kg,
+    }
+
+
+class PowershaperStandIn:
+    """An aiohttp server mimicking the meters and meter endpoints of the Powershaper API.
+
+    Latency and error responses (e.g. 403, 426, 5xx) can be injected, and every call is counted, as are the calls
+    that arrive while an identical one (same path and query) is still being answered. Bodies are gzipped for
+    clients that accept it, unless compress is turned off, and bytes_sent counts what goes on the wire.
+    """
+
+    def __init__(self, years: float = 5, latency: float = 0.0, consents: int = 1):
+        """Initialize the stand-in with years of hourly history ending two hours ago, for a number of consents."""
+        self.latest = datetime.now(timezone.utc).replace(
+            minute=0, second=0, microsecond=0) - timedelta(hours=2)
+        self.earliest = (self.latest - timedelta(days=round(365 * years))).replace(hour=0)
+        self.latency = latency
+        self.consents = consents
+        # hours left out of the served series, as holes the API has not filled yet
+        self.missing = set()
+        # whether a start at hour precision is accepted, or answered with 400 as an API without it would
+        self.accepts_hours = True
+        self.compress = True
+        self.duplicate_calls = 0
+        self._in_flight = defaultdict(int)
+        self.faults = defaultdict(deque)
+        self.calls = defaultdict(int)
+        self.bytes_sent = 0
+        self.url = None
+        self._runner = None
+
+    def inject(self, endpoint: str, *statuses: int) -> None:
+        """Make the next calls to an endpoint ("meters" or "meter") fail with the given statuses, in order."""
+        self.faults[endpoint].extend(statuses)
+
+    def publish(self, hours: int = 1) -> None:
+        """Make new hours of data available."""
+        self.latest += timedelta(hours=hours)
+
+    @property
+    def total_calls(self) -> int:
+        """Return the number of calls made to the stand-in."""
+        return sum(self.calls.values())
+
+    def reset_counters(self) -> None:
+        """Reset the call and byte counters."""
+        self.calls.clear()
+        self.bytes_sent = 0
+        self.duplicate_calls = 0
+
+    async def start(self) -> None:
+        """Start serving on a free local port."""
+        app = web.Application()
+        app.router.add_get(METERS_PATH, self._handle_meters)
+        app.router.add_get(METER_PATH + "{consent_uuid}/{meter_type}", self._handle_meter)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://127.0.0.1:{port}"
+
+    async def stop(self) -> None:
+        """Stop serving."""
+        await self._runner.cleanup()
+
+    async def _respond(self, request, endpoint: str, body) -> web.Response:
+        """Apply latency and injected faults, then send a JSON body."""
+        self.calls[endpoint] += 1
+        if self._in_flight[request.path_qs]:
+            self.duplicate_calls += 1
+        self._in_flight[request.path_qs] += 1
+        try:
+            return await self._async_answer(request, endpoint, body)
+        finally:
+            self._in_flight[request.path_qs] -= 1
+
+    async def _async_answer(self, request, endpoint: str, body) -> web.Response:
+        """Answer a counted call."""
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        if self.faults[endpoint]:
+            status = self.faults[endpoint].popleft()
+            headers = {"Retry-After": "1"} if status in (426, 429) else {}
+            return web.json_response({"detail": "injected fault"}, status=status, headers=headers)
+
+        if request.headers.get("Authorization", "").split(" ")[-1] == "":
+            return web.json_response({"detail": "Authentication credentials were not provided."}, status=403)
+
+        payload = json.dumps(body).encode()
+        headers = {}
+        if self.compress and "gzip" in request.headers.get("Accept-Encoding", ""):
+            payload = gzip.compress(payload, 6)
+            headers["Content-Encoding"] = "gzip"
+        self.bytes_sent += len(payload)
+        return web.Response(body=payload, content_type="application/json", headers=headers)
+
+    async def _respond_error(self, request, endpoint: str, status: int) -> web.Response:
+        """Count a call and answer it with an error status."""
+        self.calls[endpoint] += 1
+        return web.json_response({"detail": "invalid query"}, status=status)
+
+    async def _handle_meters(self, request) -> web.Response:
+        """List an electricity and a gas meter for each consent."""
+        meter_range = {
+            "earliest": self.earliest.strftime('%Y-%m-%dT%H:%M:%SZ'),
+            "latest": self.latest.strftime('%Y-%m-%dT%H:%M:%SZ'),
+        }
+        meters = []
+        for consent in range(self.consents):
+            consent_uuid = CONSENT_UUID.format(consent)
+            meters.append({"consent_uuid": consent_uuid, "type": "electricity", "range": meter_range})
+            meters.append({"consent_uuid": consent_uuid, "type": "gas", "range": meter_range})
+        return await self._respond(request, "meters", meters)
+
+    async def _handle_meter(self, request) -> web.Response:
+        """Serve the hourly points from the start day, or hour, to the end day (inclusive) of the query."""
+        meter_type = request.match_info["meter_type"]
+        if len(request.query["start"]) > 10:
+            # a start at hour precision (YYYY-MM-DDTHH:MM:SSZ)
+            if not self.accepts_hours:
+                return await self._respond_error(request, "meter", 400)
+            start = datetime.strptime(request.query["start"], '%Y-%m-%dT%H:%M:%SZ').replace(tzinfo=timezone.utc)
+        else:
+            start = datetime.combine(date.fromisoformat(
+                request.query["start"]), datetime.min.time(), timezone.utc)
+        end = datetime.combine(date.fromisoformat(
+            request.query["end"][:10]), datetime.min.time(), timezone.utc) + timedelta(hours=23)
+
+        hour = max(start, self.earliest)
+        end = min(end, self.latest)
+        points = []
+        while hour <= end:
+            if hour not in self.missing:
+                points.append(generate_point(meter_type, hour))
+            hour += timedelta(hours=1)
+
+        return await self._respond(request, "meter", points)
@@ -0,0 +1,213 @@
+"""
+End to end benchmarks of backfill, steady-state polling and the weekly refresh against the API stand-in.
+
+Authored by Robert Sahakyan
+"""
+import asyncio
+from datetime import timedelta
+import pytest
+from .. import api, coordinator
+from ..const import (AGGREGATE_TYPE_HOUR, BACKFILL_WINDOW_DAYS, DATA_REFRESH_INTERVAL,
+                     RESPONSE_CACHE_MIN_AGE_DAYS)
+from ..coordinator import historic_refresh
+from .harness import LOOP_LAG_TARGET
+
+POLL_CYCLES = 24
+# identical requests made at once, e.g. by entries sharing a consent
+SHARED_REQUESTS = 8
+# seconds the stand-in takes to answer them
+SHARED_REQUEST_LATENCY = 1.0
+# seconds the sensor platform may take to set up, however long the backfill takes
+SETUP_TIME_TARGET = 1.0
+# how many times cheaper than the backfill the weekly refresh must be, in calls, bytes and points
+REFRESH_FRACTION = 4
+
+
+def expected_points(stand_in) -> int:
+    """Return the number of statistics a full import of the stand-in's history produces (three sensors a consent)."""
+    hours = int((stand_in.latest - stand_in.earliest).total_seconds() // 3600) + 1
+    return hours * 3 * stand_in.consents
+
+
+@pytest.mark.asyncio
+async def test_bench_backfill(harness, stand_in):
+    """Measure the initial import of five years of history."""
+    measurement = await harness.async_measure("backfill", harness.async_setup_entry)
+    measurement.extra["platform setup"] = f"{harness.setup_time * 1000:.0f} ms"
+    print("\n" + measurement.report())
+
+    assert measurement.points_imported == expected_points(stand_in)
+    assert measurement.loop_lag_p99 < LOOP_LAG_TARGET
+    # entities are added before the backfill, which runs in the background
+    assert harness.setup_time < SETUP_TIME_TARGET
+
+
+@pytest.mark.asyncio
+async def test_bench_backfill_many_meters(harness, stand_in):
+    """Measure the initial import of a year of history for ten meters (five consents)."""
+    stand_in.consents = 5
+    stand_in.earliest = (stand_in.latest - timedelta(days=365)).replace(hour=0)
+
+    measurement = await harness.async_measure("backfill 10 meters", harness.async_setup_entry)
+    measurement.extra["sensors"] = len(harness.coordinator.sensors)
+    print("\n" + measurement.report())
+
+    assert measurement.points_imported == expected_points(stand_in)
+
+
+@pytest.mark.asyncio
+async def test_bench_polling(harness, stand_in):
+    """Measure a day of hourly polls, each with one new hour of data."""
+    # the hours published while polling are still in the past, like every hour the API serves
+    stand_in.latest -= timedelta(hours=POLL_CYCLES)
+    await harness.async_setup_entry()
+
+    async def poll_day():
+        for _ in range(POLL_CYCLES):
+            stand_in.publish(1)
+            await harness.async_poll()
+
+    measurement = await harness.async_measure("polling", poll_day)
+    measurement.extra["calls/poll"] = measurement.api_calls / POLL_CYCLES
+    measurement.extra["KiB/poll"] = round(
+        measurement.bytes_received / 1024 / POLL_CYCLES, 1)
+    print("\n" + measurement.report())
+
+    assert measurement.points_imported == POLL_CYCLES * 3
+
+
+@pytest.mark.asyncio
+async def test_bench_polling_day_precision(harness, stand_in):
+    """Measure the same day of polls against an API that only accepts a start day, as a baseline."""
+    stand_in.accepts_hours = False
+    stand_in.latest -= timedelta(hours=POLL_CYCLES)
+    await harness.async_setup_entry()
+
+    async def poll_day():
+        for _ in range(POLL_CYCLES):
+            stand_in.publish(1)
+            await harness.async_poll()
+
+    measurement = await harness.async_measure("polling by day", poll_day)
+    measurement.extra["KiB/poll"] = round(
+        measurement.bytes_received / 1024 / POLL_CYCLES, 1)
+    print("\n" + measurement.report())
+
+    assert measurement.points_imported == POLL_CYCLES * 3
+    assert not any(meter.hour_precision for meter in harness.coordinator.meters)
+
+
+@pytest.mark.asyncio
+async def test_bench_gap_fill(harness, stand_in):
+    """Measure re-fetching the hours the API had left out during the backfill, once it has them."""
+    stand_in.missing = {stand_in.latest - timedelta(days=days, hours=hours)
+                        for days in (40, 400, 1000) for hours in range(5)}
+    await harness.async_setup_entry()
+    assert all(meter.gaps.gap_count == 15 for meter in harness.coordinator.meters)
+
+    stand_in.missing = set()
+    measurement = await harness.async_measure("gap fill", harness.async_poll)
+    print("\n" + measurement.report())
+
+    assert all(meter.gaps.gap_count == 0 for meter in harness.coordinator.meters)
+    assert measurement.api_calls <= 3 * 2 * len(harness.coordinator.meters)
+
+
+@pytest.mark.asyncio
+async def test_bench_weekly_refresh(harness, stand_in):
+    """Measure the historic refresh that runs once DATA_REFRESH_INTERVAL days have passed, against the backfill."""
+    backfill = await harness.async_measure("backfill", harness.async_setup_entry)
+    for meter in harness.coordinator.meters:
+        meter.last_refresh_date -= timedelta(days=DATA_REFRESH_INTERVAL + 1)
+
+    measurement = await harness.async_measure("weekly refresh", harness.async_poll)
+    for name, value, full in (("calls", measurement.api_calls, backfill.api_calls),
+                              ("bytes", measurement.bytes_received, backfill.bytes_received),
+                              ("points", measurement.points_imported, backfill.points_imported)):
+        measurement.extra[f"{name} vs backfill"] = f"{value / full:.1%}"
+    print("\n" + backfill.report())
+    print(measurement.report())
+
+    # the refresh reconciles recent and sampled older days instead of importing the history again
+    assert all(not historic_refresh(meter.last_refresh_date) for meter in harness.coordinator.meters)
+    assert measurement.api_calls * REFRESH_FRACTION < backfill.api_calls
+    assert measurement.bytes_received * REFRESH_FRACTION < backfill.bytes_received
+    assert measurement.points_imported * REFRESH_FRACTION < backfill.points_imported
+
+
+@pytest.mark.asyncio
+async def test_bench_backfill_faults(harness, stand_in):
+    """Measure the initial import when the API is slow, throttles and fails transiently."""
+    stand_in.latency = 0.05
+    stand_in.inject("meter", 426, 503, 500)
+
+    measurement = await harness.async_measure("backfill with faults", harness.async_setup_entry)
+    measurement.extra["imported"] = f"{measurement.points_imported / expected_points(stand_in):.0%}"
+    print("\n" + measurement.report())
+
+    assert measurement.points_imported == expected_points(stand_in)
+
+
+@pytest.mark.asyncio
+async def test_bench_reimport_from_cache(harness, stand_in, monkeypatch):
+    """Measure importing the whole history again after the recorder was wiped, with closed windows cached on disk."""
+    await harness.async_setup_entry()
+
+    async def async_nothing_recorded(hass, sensor):
+        return False
+
+    monkeypatch.setattr(coordinator, "async_restore_from_recorder", async_nothing_recorded)
+    for sensor in harness.coordinator.sensors:
+        sensor.sum = 0
+        sensor.latest_timestamp = None
+        sensor.initialized = False
+        sensor.digests.clear()
+
+    measurement = await harness.async_measure("re-import from cache", harness.async_poll)
+    measurement.extra["cache hits"] = sum(meter.metrics.cache_hits for meter in harness.coordinator.meters)
+    print("\n" + measurement.report())
+
+    assert measurement.points_imported == expected_points(stand_in)
+    # only the windows too recent to be cached go to the API
+    open_windows = RESPONSE_CACHE_MIN_AGE_DAYS // BACKFILL_WINDOW_DAYS + 2
+    assert measurement.api_calls <= open_windows * len(harness.coordinator.meters)
+
+
+@pytest.mark.asyncio
+async def test_bench_shared_requests(harness, stand_in):
+    """Measure identical requests made at once, sent separately and uncompressed as a baseline, then shared."""
+    await harness.async_setup_entry()
+    # answered slower than the requests take to be sent, each on a new connection, so they are all in flight at once
+    stand_in.latency = SHARED_REQUEST_LATENCY
+    meter = harness.coordinator.meters[0]
+    scheduler = api.async_get_request_scheduler(harness.hass, meter.api_token)
+    end = stand_in.latest.date()
+    url = coordinator.url_builder(meter.meter_type, meter.consent_uuid,
+                                  str(end - timedelta(days=BACKFILL_WINDOW_DAYS)), str(end), AGGREGATE_TYPE_HOUR)
+
+    async def separate_requests():
+        await asyncio.gather(*(scheduler.async_request(url, lambda response: response.json())
+                               for _ in range(SHARED_REQUESTS)))
+
+    async def shared_requests():
+        await asyncio.gather(*(coordinator.async_fetch_data(harness.hass, meter.api_token, url)
+                               for _ in range(SHARED_REQUESTS)))
+
+    stand_in.compress = False
+    # the backfill spent the burst of the token, the baseline needs it to send its requests at once
+    scheduler.bucket.tokens = float(scheduler.bucket.capacity)
+    baseline = await harness.async_measure("separate requests, uncompressed", separate_requests)
+    baseline.extra["duplicate calls"] = stand_in.duplicate_calls
+    print("\n" + baseline.report())
+
+    stand_in.compress = True
+    shared = await harness.async_measure("shared requests, compressed", shared_requests)
+    shared.extra["duplicate calls"] = stand_in.duplicate_calls
+    shared.extra["coalesced"] = scheduler.metrics.coalesced
+    print(shared.report())
+
+    assert baseline.extra["duplicate calls"] == SHARED_REQUESTS - 1
+    assert shared.api_calls == 1
+    assert shared.extra["duplicate calls"] == 0
+    # gzip alone shrinks a window of hourly points several times over
+    assert shared.bytes_received * 3 < baseline.bytes_received / SHARED_REQUESTS
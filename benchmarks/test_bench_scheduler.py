@@ -0,0 +1,56 @@
+"""
+Simulated comparison of fixed hourly polling and the adaptive poll scheduler.
+
+Authored by Robert Sahakyan
+"""
+from datetime import datetime, timedelta, timezone
+import random
+from .. import scheduler
+
+DAYS = 28
+
+
+def publication_times(days, seed=1):
+    """Return when batches of new data get published: once a day between 05:00 and 07:00 UTC."""
+    rng = random.Random(seed)
+    start = datetime(2023, 1, 1, tzinfo=timezone.utc)
+    return [start + timedelta(days=day, hours=5, minutes=rng.randrange(120)) for day in range(days)]
+
+
+def simulate(next_poll, record, days):
+    """Poll over a number of days, returning the polls made and the mean delay until new data was picked up."""
+    published = publication_times(days)
+    now = published[0].replace(hour=0, minute=0)
+    end = now + timedelta(days=days)
+    seen = 0
+    polls = 0
+    delays = []
+
+    while now < end:
+        polls += 1
+        available = sum(1 for time in published if time <= now)
+        new_data = available > seen
+        if new_data:
+            delays.extend(now - published[index] for index in range(seen, available))
+            seen = available
+        record(now, new_data)
+        now = next_poll(now)
+
+    mean_delay = sum(delays, timedelta()) / len(delays)
+    return polls, mean_delay
+
+
+def test_bench_adaptive_polling():
+    """Compare wasted polls per day and time-to-new-data of hourly and adaptive polling."""
+    fixed_polls, fixed_delay = simulate(
+        lambda now: now + timedelta(hours=1), lambda now, new_data: None, DAYS)
+
+    poll_scheduler = scheduler.PollScheduler()
+    adaptive_polls, adaptive_delay = simulate(
+        poll_scheduler.next_poll, poll_scheduler.record, DAYS)
+
+    print(f"\nhourly: {fixed_polls / DAYS:.1f} polls/day, {fixed_delay} to new data"
+          f" | adaptive: {adaptive_polls / DAYS:.1f} polls/day, {adaptive_delay} to new data")
+
+    assert adaptive_polls < fixed_polls
+    assert adaptive_delay <= fixed_delay
@@ -0,0 +1,42 @@
+"""
+Micro-benchmark of the timestamp parser against the strptime + pytz path it replaced.
+
+Authored by Robert Sahakyan
+"""
+from datetime import datetime, timedelta
+import timeit
+import pytz
+from .. import timestamps
+
+# roughly five years of hourly points
+POINTS = 45000
+REPEAT = 5
+
+
+def strptime_pytz(timestamp):
+    """The per point parse previously done in the sensor module."""
+    return datetime.strptime(timestamp, '%Y-%m-%dT%H:%M:%SZ').replace(tzinfo=pytz.UTC)
+
+
+def hourly_series(points):
+    """Return a series of hourly Powershaper timestamps."""
+    start = datetime(2018, 1, 1, tzinfo=pytz.UTC)
+    return [(start + timedelta(hours=hour)).strftime('%Y-%m-%dT%H:%M:%SZ') for hour in range(points)]
+
+
+def test_bench_parse_timestamp():
+    """Compare parsing a multi-year hourly series with strptime and with parse_timestamp."""
+    series = hourly_series(POINTS)
+
+    baseline = min(timeit.repeat(
+        lambda: [strptime_pytz(timestamp) for timestamp in series], number=1, repeat=REPEAT))
+    fast = min(timeit.repeat(
+        lambda: [timestamps.parse_timestamp(timestamp) for timestamp in series], number=1, repeat=REPEAT))
+    epoch = min(timeit.repeat(
+        lambda: [timestamps.parse_epoch(timestamp) for timestamp in series], number=1, repeat=REPEAT))
+
+    print(f"\n{POINTS} hourly timestamps | strptime+pytz: {baseline * 1000:.1f} ms"
+          f" | parse_timestamp: {fast * 1000:.1f} ms ({baseline / fast:.1f}x)"
+          f" | parse_epoch: {epoch * 1000:.1f} ms ({baseline / epoch:.1f}x)")
+
+    assert fast < baseline
@@ -0,0 +1,102 @@
+"""
+bulk_import.py - read an hourly Powershaper export (CSV or JSON) from disk, a bounded batch at a time
+
+Authored by Robert Sahakyan
+"""
+
+import csv
+from datetime import datetime, timezone
+from itertools import islice
+import os
+from typing import Any, Iterable, Iterator
+from .const import IMPORT_FILE_BATCH_BYTES, IMPORT_FILE_BATCH_ROWS
+from .series import MeterSeries, SeriesDecoder
+from .timestamps import format_timestamp
+
+# columns an export may name the hour of a row by
+TIME_COLUMNS = ("time", "timestamp", "start")
+
+
+def normalize_timestamp(value: str) -> str:
+    """Return an ISO 8601 timestamp (e.g. 2023-01-01 00:00:00+00:00) as a Powershaper timestamp, assuming UTC."""
+    if len(value) == 20 and value.endswith('Z'):
+        return value
+    timestamp = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+    return format_timestamp(timestamp.astimezone(timezone.utc))
+
+
+def csv_points(rows: Iterable[dict[str, str]], fields: tuple[str, ...]) -> Iterator[dict[str, Any]]:
+    """Yield the rows of a CSV export as data points, as the API would return them."""
+    for row in rows:
+        timestamp = next((row[column] for column in TIME_COLUMNS if row.get(column)), None)
+        if timestamp is None:
+            raise ValueError(f"Row without a timestamp in the export: {row}")
+
+        point = {"time": normalize_timestamp(timestamp)}
+        for field in fields:
+            value = row.get(field)
+            if value is None:
+                raise ValueError(f"Column {field} is missing from the export")
+            point[field] = float(value) if value else 0.0
+        yield point
+
+
+class ExportReader:
+    """Read an export file of the hourly series of one meter as a sequence of MeterSeries batches.
+
+    A CSV export has a header with a time column and a column per field, a JSON export is an array of
+    data points as returned by the API. Either way only a batch is held in memory, so files of millions
+    of rows can be read. The rows are expected in chronological order, rows not newer than the one
+    before are skipped. Every read is blocking and meant to run in the executor.
+    """
+
+    def __init__(self, path: str, fields: Iterable[str]):
+        """Initialize a reader, its format is told by the extension of the file."""
+        self.path = path
+        self.fields = tuple(fields)
+        self.is_json = os.path.splitext(path)[1].lower() == ".json"
+        self._file = None
+        self._rows = None
+        self._decoder = None
+        self._last_hour = None
+
+    def open(self) -> None:
+        """Open the file."""
+        if self.is_json:
+            self._file = open(self.path, "rb")
+            self._decoder = SeriesDecoder(self.fields)
+        else:
+            self._file = open(self.path, newline="", encoding="utf-8-sig")
+            self._rows = csv_points(csv.DictReader(self._file), self.fields)
+
+    def close(self) -> None:
+        """Close the file."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _read_next(self) -> tuple[MeterSeries, bool]:
+        """Return the series decoded from the next part of the file, and whether the file has been read."""
+        if self.is_json:
+            data = self._file.read(IMPORT_FILE_BATCH_BYTES)
+            if not data:
+                self._decoder.close()
+                return MeterSeries(self.fields), True
+            return self._decoder.feed(data), False
+
+        series = MeterSeries.from_points(islice(self._rows, IMPORT_FILE_BATCH_ROWS), self.fields)
+        return series, not len(series)
+
+    def read_batch(self) -> MeterSeries:
+        """Return the next batch of the series, an empty one once the whole file has been read."""
+        while True:
+            series, finished = self._read_next()
+            # batches carry on from each other, overlapping or unordered rows are dropped
+            series = series.after(self._last_hour)
+            if len(series):
+                self._last_hour = series.last_hour
+                return series
+            if finished:
+                return series
@@ -3,11 +3,18 @@ Config flow for Powershaper integration.
 
 Authored by Robert Sahakyan
 """
+import asyncio
+import os
 from typing import Any
-from homeassistant import config_entries, exceptions
-from homeassistant.core import HomeAssistant
-from homeassistant.helpers.aiohttp_client import async_get_clientsession
-from .const import (DOMAIN, API_TOKEN_LENGTH, POWERSHAPER_AUTH_URL)
+from homeassistant import config_entries
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.exceptions import HomeAssistantError
+from .const import (DOMAIN, API_TOKEN_LENGTH, POWERSHAPER_AUTH_URL, CONF_METERS,
+                    TOKEN_VALIDATION_MAX_RETRIES)
+from .api import ApiError, QuotaExceeded, async_get_request_scheduler
+from .meter_cache import entry_data_with_meters
+from .coordinator import meters_from_response
+from .services import async_import_file
 from aiohttp.client_exceptions import ClientError
 from aiohttp.web import HTTPForbidden
 
@@ -20,8 +27,8 @@ DATA_SCHEMA = {vol.Required("api_token"): str}
 _LOGGER = logging.getLogger(__name__)
 
 
-async def async_validate_api_token(hass: HomeAssistant, user_input: dict[str, Any]) -> None:
-    """Validate the API token provided by the user"""
+async def async_validate_api_token(hass: HomeAssistant, user_input: dict[str, Any]) -> list[dict[str, Any]]:
+    """Validate the API token provided by the user, returning the meters listed for it"""
 
     api_token = user_input['api_token']
     if len(api_token) != API_TOKEN_LENGTH:
@@ -29,35 +36,31 @@ async def async_validate_api_token(hass: HomeAssistant, user_input: dict[str, An
             f"Invalid token length. Expected: {API_TOKEN_LENGTH} | Received: {len(api_token)}")
         raise ValueError
 
-    session = async_get_clientsession(hass)
-    api_url = POWERSHAPER_AUTH_URL
-    headers = {
-        'Authorization': f'Token {api_token}',
-        'Content-Type': 'application/json'
-    }
+    # through the token's request budget, so a throttled token is paused and retried like any other request
+    scheduler = async_get_request_scheduler(hass, api_token, keep=False)
+    try:
+        return await scheduler.async_request(POWERSHAPER_AUTH_URL, lambda response: response.json(),
+                                             TOKEN_VALIDATION_MAX_RETRIES)
+    except ApiError as error:
+        if error.status == 403:
+            _LOGGER.debug(
+                f"Invalid or no authorisation token supplied, response status: {error.status}")
+            raise HTTPForbidden from error
 
-    async with session.get(api_url, headers=headers) as response:
-        await response.json()
-
-    if response.status == 403:
-        _LOGGER.debug(
-            f"Invalid or no authorisation token supplied, response status: {response.status}")
-        raise HTTPForbidden
-
-    if response.status == 426:
         _LOGGER.debug(
-            f"Call rate quota exceeded, response status: {response.status}")
-        raise QuotaExceeded
-
-    if response.status != 200:
-        _LOGGER.debug(
-            f"Error occurred whilst fetching Powershaper API, response status: {response.status}")
-        raise ClientError
+            f"Error occurred whilst fetching Powershaper API, response status: {error.status}")
+        raise ClientError from error
 
 
 class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
     """Handle a config flow for the PowerShaper."""
 
+    @staticmethod
+    @callback
+    def async_get_options_flow(config_entry):
+        """Return the options flow, used to import an export file into a meter."""
+        return OptionsFlow(config_entry)
+
     async def async_step_user(self, user_input=None):
 
         errors = {}
@@ -65,19 +68,21 @@ class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
         if user_input is not None:
             try:
                 # validate api token
-                await async_validate_api_token(self.hass, user_input)
+                response_data = await async_validate_api_token(self.hass, user_input)
             except ValueError:
                 errors["base"] = "invalid_token_length"
             except HTTPForbidden:
                 errors['base'] = "invalid_access"
             except QuotaExceeded:
                 errors['base'] = "quota_exceeded"
-            except ClientError:
+            except (ClientError, asyncio.TimeoutError):
                 errors['base'] = "client_error"
             except Exception:
                 errors['base'] = "unknown_error"
             else:
-                return self.async_create_entry(title="Powershaper", data=user_input)
+                # the meters are kept with the entry, so setting up the sensors needs no further call
+                return self.async_create_entry(
+                    title="Powershaper", data=entry_data_with_meters(user_input, response_data))
 
         return self.async_show_form(step_id="user",
                                     data_schema=vol.Schema(DATA_SCHEMA),
@@ -85,5 +90,56 @@ class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
                                     )
 
 
-class QuotaExceeded(exceptions.HomeAssistantError):
-    """Call rate quota exceeded."""
+class OptionsFlow(config_entries.OptionsFlow):
+    """Import a local Powershaper export file into one of the meters of an entry."""
+
+    def __init__(self, config_entry):
+        """Initialize the options flow."""
+        self.config_entry = config_entry
+
+    async def async_step_init(self, user_input=None):
+
+        errors = {}
+        meters = {meter.key: f"{meter.meter_type} ({meter.consent_uuid})" for meter in meters_from_response(
+            self.config_entry.data.get(CONF_METERS, []), self.config_entry.data['api_token'])}
+
+        if user_input is not None and user_input.get("import_path"):
+            entry_data = self.hass.data.get(DOMAIN, {}).get(self.config_entry.entry_id, {})
+            coordinator = entry_data.get("coordinator")
+            meter = next((meter for meter in coordinator.meters if meter.key == user_input.get("meter")),
+                         None) if coordinator else None
+
+            import_path = user_input["import_path"]
+            if meter is None:
+                errors['base'] = "meter_not_found"
+            elif not self.hass.config.is_allowed_path(import_path):
+                errors['base'] = "path_not_allowed"
+            elif not await self.hass.async_add_executor_job(os.path.isfile, import_path):
+                errors['base'] = "file_not_found"
+            else:
+                # the import runs on in the background, cancelled if the entry is unloaded,
+                # polling carries on from its last hour
+                self.config_entry.async_create_background_task(
+                    self.hass, self.async_import(coordinator, meter, import_path),
+                    f"{DOMAIN} import {import_path}")
+                return self.async_create_entry(title="", data={})
+        elif user_input is not None:
+            return self.async_create_entry(title="", data={})
+
+        return self.async_show_form(step_id="init",
+                                    data_schema=vol.Schema({
+                                        vol.Optional("import_path"): str,
+                                        vol.Optional("meter"): vol.In(meters),
+                                    }),
+                                    errors=errors
+                                    )
+
+    async def async_import(self, coordinator, meter, import_path: str) -> None:
+        """Import an export file started from the options, logging what the form can no longer show."""
+        try:
+            imported = await async_import_file(
+                self.hass, self.config_entry.entry_id, coordinator, meter, import_path)
+        except (HomeAssistantError, OSError, ValueError) as ex:
+            _LOGGER.error(f"Unable to import {import_path} into the {meter.meter_type} meter: {ex}")
+            return
+        _LOGGER.info(f"Imported {imported} hours from {import_path} into the {meter.meter_type} meter")
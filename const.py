@@ -3,8 +3,12 @@ Constants for the Powershaper integration.
 
 Authored by Robert Sahakyan
 """
+from datetime import timedelta
 
 DOMAIN = "powershaper_monitor"
+# hass.data key of what every config entry shares (session, request schedulers, caches),
+# hass.data[DOMAIN] only holds the data of each entry, by entry id
+DATA_SHARED = f"{DOMAIN}_shared"
 
 API_TOKEN_LENGTH = 40
 AGGREGATE_TYPE_ALL = "all"
@@ -23,5 +27,87 @@ SENSOR_TYPE_CARBON = "elec_carbon"
 
 MEASUREMENT_UNIT_KG = "kg"
 
+# the meters listed for the API token are cached in the config entry and refreshed in the background
+CONF_METERS = "meters"
+CONF_METERS_UPDATED = "meters_updated"
+# the consent of the meter of each type whose sensors keep the plain statistic ids (sensor.gas, ...)
+CONF_PRIMARY_CONSENTS = "primary_consents"
+METERS_CACHE_TTL = timedelta(hours=24)
+
 # configurable
 DATA_REFRESH_INTERVAL = 7
+
+# historic data is fetched in windows of this many days, BACKFILL_CONCURRENCY windows at a time
+BACKFILL_WINDOW_DAYS = 31
+BACKFILL_CONCURRENCY = 4
+
+# historic windows are decoded (in the executor) and imported in batches of this many bytes as they stream in
+STREAM_BATCH_BYTES = 128 * 1024
+STREAM_QUEUE_BATCHES = 2
+
+# meters with at least this many days of history are decoded in a process pool, None keeps to the executor
+PARSE_PROCESS_POOL_MIN_DAYS = None
+PARSE_PROCESS_POOL_WORKERS = 2
+
+# adaptive polling, see scheduler.py
+POLL_INTERVAL_DENSE = timedelta(minutes=15)
+POLL_INTERVAL_DEFAULT = timedelta(hours=1)
+POLL_INTERVAL_MAX = timedelta(hours=8)
+POLL_MIN_OBSERVATIONS = 3
+
+# request budget and retries per API token, see api.py
+REQUEST_BUDGET_PER_MINUTE = 60
+REQUEST_BURST = 10
+REQUEST_MAX_RETRIES = 5
+# the config flow is waiting on a token being validated, it gives up sooner
+TOKEN_VALIDATION_MAX_RETRIES = 1
+REQUEST_BACKOFF_BASE = 1
+REQUEST_BACKOFF_MAX = 60
+REQUEST_QUOTA_PAUSE = 60
+REQUEST_TIMEOUT = 120
+# seconds to open a connection and between two reads of a response, within REQUEST_TIMEOUT
+REQUEST_CONNECT_TIMEOUT = 15
+REQUEST_READ_TIMEOUT = 60
+# connections of the integration's own session, kept alive for this many seconds between requests
+API_CONNECTION_LIMIT = 16
+API_KEEPALIVE_TIMEOUT = 60
+# responses that mean the call rate quota of the token is exceeded
+QUOTA_STATUSES = (426, 429)
+
+# outcomes of a meter update, shown in the diagnostics
+POLL_OUTCOME_NEW_DATA = "new_data"
+POLL_OUTCOME_EMPTY = "empty"
+POLL_OUTCOME_ERROR = "error"
+
+# windows that ended at least this many days ago are cached on disk, up to this many bytes, see response_cache.py
+RESPONSE_CACHE_MIN_AGE_DAYS = 35
+RESPONSE_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+# the weekly refresh re-checks this many trailing days plus this many older windows against the stored digests
+RECONCILE_TRAILING_DAYS = 7
+RECONCILE_SAMPLE_WINDOWS = 2
+
+# missing hours are re-fetched once a GAP_FILL_INTERVAL, at most GAP_FILL_MAX_RANGES gaps a meter at a time,
+# giving up on a gap the API still has no data for after GAP_FILL_MAX_ATTEMPTS tries
+GAP_FILL_INTERVAL = timedelta(days=1)
+GAP_FILL_MAX_RANGES = 10
+GAP_FILL_MAX_ATTEMPTS = 3
+
+STORAGE_VERSION = 1
+STORAGE_SAVE_DELAY = 30
+
+# series downloads in flight at once across every meter and config entry
+MAX_CONCURRENT_FETCHES = 8
+
+# statistics are handed to the recorder in chunks of this many hours, waiting while its queue holds
+# more than RECORDER_BACKLOG_LIMIT jobs
+IMPORT_CHUNK_SIZE = 1000
+RECORDER_BACKLOG_LIMIT = 100
+RECORDER_BACKLOG_WAIT = 0.5
+
+# export files are imported in batches of this many CSV rows or JSON bytes
+IMPORT_FILE_BATCH_ROWS = 24 * 366
+IMPORT_FILE_BATCH_BYTES = 1024 * 1024
+
+# columnar export files leave room for this many hours past their last one, so new hours are appended in place
+EXPORT_HEADROOM_HOURS = 24 * 92
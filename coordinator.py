@@ -0,0 +1,854 @@
+"""
+coordinator.py - fetch metering data from powershaper once per meter and share it between the sensors
+
+Authored by Robert Sahakyan
+"""
+
+import asyncio
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+import logging
+import time
+from typing import Any, AsyncIterator, NamedTuple
+from datetime import datetime, timedelta, timezone, date
+from .const import (DOMAIN,
+                    DATA_SHARED,
+                    SENSOR_TYPE_GAS,
+                    SENSOR_TYPE_ELECTRICITY,
+                    POWERSHAPER_BASE_SENSOR_URL,
+                    AGGREGATE_TYPE_HOUR,
+                    DATA_REFRESH_INTERVAL,
+                    BACKFILL_WINDOW_DAYS,
+                    BACKFILL_CONCURRENCY,
+                    MAX_CONCURRENT_FETCHES,
+                    IMPORT_CHUNK_SIZE,
+                    RECORDER_BACKLOG_LIMIT,
+                    RECORDER_BACKLOG_WAIT,
+                    STREAM_BATCH_BYTES,
+                    PARSE_PROCESS_POOL_MIN_DAYS,
+                    PARSE_PROCESS_POOL_WORKERS,
+                    STREAM_QUEUE_BATCHES,
+                    RECONCILE_TRAILING_DAYS,
+                    RECONCILE_SAMPLE_WINDOWS,
+                    STORAGE_VERSION,
+                    STORAGE_SAVE_DELAY,
+                    GAP_FILL_INTERVAL,
+                    GAP_FILL_MAX_RANGES,
+                    GAP_FILL_MAX_ATTEMPTS,
+                    POLL_OUTCOME_NEW_DATA,
+                    POLL_OUTCOME_EMPTY,
+                    POLL_OUTCOME_ERROR)
+from .api import ApiError, async_get_request_scheduler
+from .metrics import MeterMetrics
+from .scheduler import PollScheduler
+from .timestamps import format_timestamp
+from .series import (MeterSeries, SeriesDecoder, decode_series, points_after,
+                     timestamp_to_hour, hour_to_datetime, day_to_datetime)
+from .streaming import async_iter_decoded
+from .reconcile import DigestIndex, day_digests
+from .bulk_import import ExportReader
+from .response_cache import async_get_response_cache, window_is_closed
+from .gaps import GapIndex
+from .usage import UsageIndex, usage_path
+from .export import sync_export
+from homeassistant.helpers.update_coordinator import DataUpdateCoordinator, UpdateFailed
+from homeassistant.const import EVENT_HOMEASSISTANT_STOP
+from homeassistant.helpers.storage import Store
+from homeassistant.util import dt as dt_util
+from homeassistant.components.recorder import get_instance
+from homeassistant.components.recorder.statistics import (
+    async_import_statistics,
+    get_last_statistics,
+)
+
+SCAN_INTERVAL = timedelta(seconds=3600)
+
+# keys of a meter in the meters endpoint that may carry its type
+METER_TYPE_KEYS = ("type", "meter_type", "fuel_type", "fuel")
+# shortest time between two update cycles, however many meters are due
+MIN_UPDATE_INTERVAL = timedelta(minutes=1)
+
+
+_LOGGER = logging.getLogger(__name__)
+
+
+async def async_fetch_data(hass, api_token, url) -> Any:
+    """Fetch data from Powershaper's API, within the request budget of the API token."""
+    scheduler = async_get_request_scheduler(hass, api_token)
+
+    # concurrent fetches of the same url, e.g. by entries sharing a consent, share one request
+    return await scheduler.async_shared_request(("json", url), url, lambda response: response.json())
+
+
+async def async_stream_data(hass, api_token, url, fields, use_process_pool=False,
+                            metrics=None) -> AsyncIterator[MeterSeries]:
+    """Stream a series from Powershaper's API, yielding batches of it as they are decoded.
+
+    Decoding the JSON and building the series runs in the executor, a batch for every STREAM_BATCH_BYTES
+    received. With use_process_pool the whole response is read and decoded at once in a process pool instead.
+    The points decoded and the time it took are recorded in metrics, if given.
+    """
+    scheduler = async_get_request_scheduler(hass, api_token)
+    fields = tuple(fields)
+
+    async def async_run_timed(run_job, job, *args):
+        start = time.perf_counter()
+        series = await run_job(job, *args)
+        if metrics is not None:
+            metrics.record_parse(len(series), time.perf_counter() - start)
+        return series
+
+    async def async_decode(response):
+        if use_process_pool:
+            data = await response.read()
+            yield await async_run_timed(
+                partial(hass.loop.run_in_executor, async_get_process_pool(hass)), decode_series, data, fields)
+            return
+
+        decoder = SeriesDecoder(fields)
+        async for series in async_iter_decoded(response, decoder.feed, STREAM_BATCH_BYTES,
+                                               partial(async_run_timed, hass.async_add_executor_job)):
+            yield series
+        decoder.close()
+
+    # concurrent downloads of the same window, e.g. by entries sharing a consent, share one download
+    async for series in scheduler.async_shared_stream(("series", url, fields), url, async_decode):
+        yield series
+
+
+def async_get_process_pool(hass) -> ProcessPoolExecutor:
+    """Return the process pool used to decode very large histories, shut down when Home Assistant stops."""
+    shared_data = hass.data.setdefault(DATA_SHARED, {})
+
+    if "process_pool" not in shared_data:
+        process_pool = ProcessPoolExecutor(max_workers=PARSE_PROCESS_POOL_WORKERS)
+        shared_data["process_pool"] = process_pool
+        hass.bus.async_listen_once(
+            EVENT_HOMEASSISTANT_STOP, lambda event: process_pool.shutdown(wait=False))
+
+    return shared_data["process_pool"]
+
+
+def async_get_fetch_semaphore(hass) -> asyncio.Semaphore:
+    """Return the semaphore limiting the series downloads in flight across every meter and config entry."""
+    shared_data = hass.data.setdefault(DATA_SHARED, {})
+
+    if "fetch_semaphore" not in shared_data:
+        shared_data["fetch_semaphore"] = asyncio.Semaphore(MAX_CONCURRENT_FETCHES)
+
+    return shared_data["fetch_semaphore"]
+
+
+def parse_meter_type(meter_data: dict[str, Any]):
+    """Return the type (gas or electricity) of a meter listed by the meters endpoint, None if it is not known."""
+    for key in METER_TYPE_KEYS:
+        value = str(meter_data.get(key) or "").lower()
+        if "gas" in value:
+            return SENSOR_TYPE_GAS
+        if "elec" in value:
+            return SENSOR_TYPE_ELECTRICITY
+    return None
+
+
+def meters_from_response(response_data: list[dict[str, Any]], api_token: str) -> list:
+    """Build a meter for every meter with data listed by the meters endpoint, ordered by consent and type."""
+    meter_types = [parse_meter_type(meter_data) for meter_data in response_data]
+
+    if not any(meter_types):
+        # without a type the electricity meter is listed first and the gas meter second
+        legacy_types = [SENSOR_TYPE_ELECTRICITY, SENSOR_TYPE_GAS]
+        meter_types = [legacy_types[index] if index < len(legacy_types) else None
+                       for index in range(len(response_data))]
+
+    meters = []
+    for meter_data, meter_type in zip(response_data, meter_types):
+        meter_range = meter_data.get('range') or {}
+        if meter_type is None or not meter_range.get('earliest') or not meter_range.get('latest'):
+            _LOGGER.warning(
+                f"Skipping meter of consent {meter_data.get('consent_uuid')}: unknown type or no data")
+            continue
+
+        meters.append(PowershaperMeter(meter_data["consent_uuid"], meter_type, api_token,
+                                       meter_range['earliest'][:10], meter_range['latest'][:10]))
+
+    return sorted(meters, key=lambda meter: (meter.consent_uuid, meter.meter_type))
+
+
+def url_builder(meter_type: str, consent_uuid: str, start_date: str, end_date: str, aggregate: str) -> str:
+    """Build a url which is used to fetch the latest data from Powershaper for a given meter type: gas or electricity."""
+
+    return POWERSHAPER_BASE_SENSOR_URL+consent_uuid+"/"+meter_type+"?start="+start_date+"&end="+end_date+"&aggregate="+aggregate+"&tz=UTC"
+
+
+def date_windows(start_date: str, end_date: str, window_days: int) -> list[tuple[str, str]]:
+    """Split the range start_date -> end_date (YYYY-MM-DD) into consecutive windows of at most window_days days.
+
+    Consecutive windows share their boundary day, points that are returned twice are filtered out on import.
+    """
+    start = date.fromisoformat(start_date)
+    end = date.fromisoformat(end_date)
+    windows = []
+
+    while start < end:
+        window_end = min(start + timedelta(days=window_days), end)
+        windows.append((str(start), str(window_end)))
+        start = window_end
+
+    if not windows:
+        windows.append((start_date, end_date))
+
+    return windows
+
+
+async def async_fetch_historic_data(hass, meter, sensors, progress_callback=None) -> None:
+    """Fetches all available historic data for a given meter, one window at a time, and imports it into the given sensors.
+
+    Up to BACKFILL_CONCURRENCY windows are streamed ahead (within the MAX_CONCURRENT_FETCHES downloads
+    allowed across every meter) but imported in order,
+    so the running sums carry over from one window to the next. Each window is decoded and imported in
+    batches of STREAM_BATCH_BYTES, with at most STREAM_QUEUE_BATCHES batches buffered per window.
+    The share of windows imported is kept in meter.backfill_progress, progress_callback is called as it changes.
+    Closed windows are read from the on-disk response cache when they are in it, and added to it when they are not.
+    """
+    # a backfill that failed part way carries on from the hour every sensor has reached
+    start_date = meter.earliest_date
+    if meter.latest_timestamp is not None:
+        start_date = max(start_date, meter.latest_timestamp[:10])
+
+    all_windows = date_windows(start_date, str(date.today()), BACKFILL_WINDOW_DAYS)
+    windows = iter(all_windows)
+    windows_imported = 0
+    semaphore = async_get_fetch_semaphore(hass)
+    cache = async_get_response_cache(hass)
+
+    history_days = (date.today() - date.fromisoformat(meter.earliest_date)).days
+    use_process_pool = (PARSE_PROCESS_POOL_MIN_DAYS is not None
+                        and history_days >= PARSE_PROCESS_POOL_MIN_DAYS)
+
+    async def async_stream_window(queue, start_date, end_date):
+        window = (meter.consent_uuid, meter.meter_type, start_date, end_date, AGGREGATE_TYPE_HOUR)
+        api_url = url_builder(meter.meter_type, meter.consent_uuid,
+                              start_date, end_date, AGGREGATE_TYPE_HOUR)
+        try:
+            window_series = None
+            if window_is_closed(end_date):
+                cached = await hass.async_add_executor_job(cache.get, *window, meter.fields)
+                if cached is not None:
+                    meter.metrics.record_cache_hit()
+                    await queue.put(cached)
+                    await queue.put(None)
+                    return
+                window_series = MeterSeries(meter.fields)
+
+            async with semaphore:
+                async for series in async_stream_data(hass, meter.api_token, api_url,
+                                                      meter.fields, use_process_pool, meter.metrics):
+                    if window_series is not None:
+                        window_series.extend_series(series)
+                    await queue.put(series)
+
+            if window_series is not None and len(window_series):
+                await hass.async_add_executor_job(cache.put, *window, window_series)
+        except Exception:
+            await queue.put(None)
+            raise
+        await queue.put(None)
+
+    pending = deque()
+
+    def schedule_next_window() -> None:
+        window = next(windows, None)
+        if window is not None:
+            queue = asyncio.Queue(maxsize=STREAM_QUEUE_BATCHES)
+            pending.append((hass.async_create_task(
+                async_stream_window(queue, *window)), queue))
+
+    for _ in range(BACKFILL_CONCURRENCY):
+        schedule_next_window()
+
+    try:
+        while pending:
+            task, queue = pending.popleft()
+
+            while (series := await queue.get()) is not None:
+                for sensor in sensors:
+                    await async_import_new_data(hass, sensor, series)
+
+            # raises if the window failed to download
+            await task
+            schedule_next_window()
+
+            windows_imported += 1
+            meter.backfill_progress = round(
+                100 * windows_imported / len(all_windows), 1)
+            if progress_callback is not None:
+                progress_callback()
+    finally:
+        for task, _ in pending:
+            task.cancel()
+        meter.backfill_progress = None
+
+
+async def async_poll_new_data(hass, meter) -> MeterSeries:
+    """Calls the Powershaper API to check if there is new data available for a given meter.
+
+    Only the hours after the latest imported one are requested. Should the API reject a start at hour
+    precision (HTTP 400), the meter falls back to requesting from the start of the day of that hour.
+    Returns the series of new data, which is empty if no new data is available.
+    """
+    today = str(date.today())
+    latest_hour = timestamp_to_hour(meter.latest_timestamp)
+
+    if meter.hour_precision:
+        start = format_timestamp(hour_to_datetime(latest_hour + 1))
+        api_url = url_builder(meter.meter_type, meter.consent_uuid, start, today, AGGREGATE_TYPE_HOUR)
+        try:
+            response_data = await async_fetch_data(hass, meter.api_token, api_url)
+        except ApiError as ex:
+            if ex.status != 400:
+                raise
+            _LOGGER.debug(f"Hour precision polling rejected for {meter.meter_type} meter, polling by day")
+            meter.hour_precision = False
+
+    if not meter.hour_precision:
+        api_url = url_builder(meter.meter_type, meter.consent_uuid,
+                              meter.latest_timestamp[:10], today, AGGREGATE_TYPE_HOUR)
+        response_data = await async_fetch_data(hass, meter.api_token, api_url)
+
+    # Since we cannot predict which hour the last timestamp was made available
+    # this ensures that only data after the last imported timestamp is parsed and added
+    parse_start = time.perf_counter()
+    new_points = points_after(response_data or [], meter.latest_timestamp)
+    series = MeterSeries.from_points(new_points, meter.fields)
+    meter.metrics.record_parse(len(series), time.perf_counter() - parse_start)
+    return series.after(latest_hour)
+
+
+async def async_import_new_data(hass, sensor, series: MeterSeries) -> None:
+    """Imports the hours of a series that are newer than the latest timestamp of a sensor, carrying on its running sum."""
+    if sensor.latest_timestamp is not None:
+        series = series.after(timestamp_to_hour(sensor.latest_timestamp))
+    if not len(series):
+        return
+
+    response = await async_import_data(hass, sensor, series, sensor.sum)
+    sensor.digests.record(series, sensor.data_key, sensor.sum)
+    sensor.meter.gaps.mark(series.hours)
+    sensor.meter.usage.extend(series)
+    sensor.sum = response.sum
+    sensor.latest_timestamp = response.latest_timestamp
+
+
+async def async_import_data(hass, sensor, series: MeterSeries, current_sum) -> NamedTuple:
+    """Imports a series into Home Assistant's database using the Statistics API."""
+    key_type = sensor.data_key
+
+    metadata = {
+        "has_mean": False,
+        "has_sum": True,
+        "name": None,
+        "source": "recorder",
+        "statistic_id": sensor.statistic_id,
+        "unit_of_measurement": sensor.unit_of_measurement
+    }
+
+    # the statistics are only built from the arrays of the series at this point, a chunk at a time in the executor
+    import_start = time.perf_counter()
+    for start in range(0, len(series), IMPORT_CHUNK_SIZE):
+        chunk = await hass.async_add_executor_job(
+            series.statistics, key_type, current_sum, start, start + IMPORT_CHUNK_SIZE)
+        async_import_statistics(hass, metadata, chunk)
+        await async_wait_for_recorder(hass)
+    sensor.meter.metrics.record_import(len(series), time.perf_counter() - import_start)
+
+    ReturnData = namedtuple('ReturnData', ['sum', 'latest_timestamp'])
+    return ReturnData(current_sum + series.total(key_type), series.last_timestamp)
+
+
+async def async_wait_for_recorder(hass) -> None:
+    """Yield to the event loop, and hold back further imports while the recorder's queue is deep."""
+    recorder = get_instance(hass)
+
+    while getattr(recorder, "backlog", 0) > RECORDER_BACKLOG_LIMIT:
+        await asyncio.sleep(RECORDER_BACKLOG_WAIT)
+
+    await asyncio.sleep(0)
+
+
+async def async_restore_from_recorder(hass, sensor) -> bool:
+    """Restores the running sum and latest imported timestamp of a sensor from its last stored statistic.
+
+    Returns False when nothing has been imported for the sensor yet.
+    """
+    statistic_id = sensor.statistic_id
+
+    last_statistics = await get_instance(hass).async_add_executor_job(
+        get_last_statistics, hass, 1, statistic_id, True, {"sum"})
+
+    if not last_statistics.get(statistic_id):
+        return False
+
+    last_statistic = last_statistics[statistic_id][0]
+
+    # depending on the recorder version the start is a datetime or a unix timestamp
+    start = last_statistic["start"]
+    if not isinstance(start, datetime):
+        start = datetime.fromtimestamp(start, tz=timezone.utc)
+
+    sensor.sum = last_statistic["sum"] or 0
+    sensor.latest_timestamp = format_timestamp(start)
+
+    return True
+
+
+async def async_fetch_series(hass, meter, start_date: str, end_date: str) -> MeterSeries:
+    """Fetches the hours between two days (YYYY-MM-DD) of a meter into a single series."""
+    series = MeterSeries(meter.fields)
+
+    for window_start, window_end in date_windows(start_date, end_date, BACKFILL_WINDOW_DAYS):
+        api_url = url_builder(meter.meter_type, meter.consent_uuid,
+                              window_start, window_end, AGGREGATE_TYPE_HOUR)
+        async for batch in async_stream_data(hass, meter.api_token, api_url, meter.fields, metrics=meter.metrics):
+            series.extend_series(batch)
+
+    return series
+
+
+def reconcile_ranges(meter, latest_day: int) -> list[tuple[int, int]]:
+    """Return the (first, last) epoch days to re-check: the trailing days plus the next sampled older windows.
+
+    The sampled windows walk back through the history from one refresh to the next, wrapping around at the earliest day.
+    """
+    earliest_day = (date.fromisoformat(meter.earliest_date) - date(1970, 1, 1)).days
+    trailing_start = max(latest_day - RECONCILE_TRAILING_DAYS + 1, earliest_day)
+    ranges = [(trailing_start, latest_day)]
+
+    cursor = meter.reconcile_cursor
+    for _ in range(RECONCILE_SAMPLE_WINDOWS):
+        if cursor is None or cursor < earliest_day or cursor >= trailing_start:
+            cursor = trailing_start - 1
+        if cursor < earliest_day:
+            break
+        start = max(cursor - BACKFILL_WINDOW_DAYS + 1, earliest_day)
+        ranges.append((start, cursor))
+        cursor = start - 1
+
+    meter.reconcile_cursor = cursor
+    return ranges
+
+
+async def async_reimport_changed_days(hass, meter, series: MeterSeries, first_day: int, last_day: int) -> set[int]:
+    """Re-imports the days between two epoch days of a freshly fetched series that differ from their digests.
+
+    The sums of the statistics after a re-imported day are shifted by its change with the recorder's async_adjust_statistics,
+    and the cached windows covering it are dropped. Returns the days re-imported.
+    """
+    day_ranges = {day: (start, stop) for day, start, stop in series.day_ranges()
+                  if first_day <= day <= last_day}
+    revised_days = set()
+
+    for sensor in meter.sensors:
+        digests = day_digests(series, sensor.data_key)
+        digests = {day: digests[day] for day in day_ranges}
+
+        for day in sensor.digests.changed_days(digests):
+            base_sum = sensor.digests.cumulative_before(day)
+            day_series = series.slice(*day_ranges[day])
+            await async_import_data(hass, sensor, day_series, base_sum)
+            meter.gaps.mark(day_series.hours)
+
+            delta = sensor.digests.replace_day(day, digests[day], base_sum)
+            if delta:
+                get_instance(hass).async_adjust_statistics(
+                    sensor.statistic_id, day_to_datetime(day + 1), delta, sensor.unit_of_measurement)
+                sensor.sum += delta
+            revised_days.add(day)
+
+    for day in sorted(revised_days):
+        meter.usage.replace(series.slice(*day_ranges[day]))
+
+    if revised_days:
+        # hours before the end of the export changed, it cannot just be appended to
+        meter.export_rewrite = True
+        await hass.async_add_executor_job(
+            async_get_response_cache(hass).invalidate, meter.consent_uuid, meter.meter_type,
+            [day_to_datetime(day).date() for day in revised_days])
+
+    return revised_days
+
+
+async def async_reconcile_meter(hass, meter) -> int:
+    """Re-checks the recent and a sample of the older history of a meter against the per day digests of its sensors.
+
+    Only the days that changed upstream are re-imported. Returns the number of days re-imported.
+    """
+    latest_hour = timestamp_to_hour(meter.latest_timestamp)
+    revised = 0
+
+    for first_day, last_day in reconcile_ranges(meter, latest_hour // 24):
+        series = await async_fetch_series(
+            hass, meter, str(day_to_datetime(first_day).date()), str(day_to_datetime(last_day).date()))
+        revised += len(await async_reimport_changed_days(
+            hass, meter, series.until(latest_hour), first_day, last_day))
+
+    return revised
+
+
+def gap_day_ranges(meter) -> list[tuple[int, int]]:
+    """Return the (first, last) epoch days to re-fetch for the gaps of a meter that are still worth trying.
+
+    Gaps on the same or adjacent days are fetched together, at most GAP_FILL_MAX_RANGES ranges at a time.
+    """
+    day_ranges = []
+    for first_hour, last_hour in meter.gaps.missing_ranges():
+        if meter.gap_attempts.get(first_hour, 0) >= GAP_FILL_MAX_ATTEMPTS:
+            continue
+        meter.gap_attempts[first_hour] = meter.gap_attempts.get(first_hour, 0) + 1
+
+        first_day, last_day = first_hour // 24, last_hour // 24
+        if day_ranges and first_day <= day_ranges[-1][1] + 1:
+            day_ranges[-1] = (day_ranges[-1][0], max(last_day, day_ranges[-1][1]))
+        elif len(day_ranges) < GAP_FILL_MAX_RANGES:
+            day_ranges.append((first_day, last_day))
+        else:
+            # left for the next run
+            meter.gap_attempts[first_hour] -= 1
+            break
+
+    return day_ranges
+
+
+async def async_fill_gaps(hass, meter) -> int:
+    """Re-fetches the days of the hours missing from a meter's series and imports the ones the API now has.
+
+    The hours are imported with sums re-based on the day before them, like revised days. Returns the number of hours filled.
+    """
+    latest_hour = timestamp_to_hour(meter.latest_timestamp)
+    gaps_before = meter.gaps.gap_count
+
+    for first_day, last_day in gap_day_ranges(meter):
+        series = await async_fetch_series(
+            hass, meter, str(day_to_datetime(first_day).date()), str(day_to_datetime(last_day).date()))
+        await async_reimport_changed_days(hass, meter, series.until(latest_hour), first_day, last_day)
+
+    return gaps_before - meter.gaps.gap_count
+
+
+def historic_refresh(last_refresh_date) -> bool:
+    """A check whether it is time to do a historic data refresh"""
+    if (datetime.now() - last_refresh_date >= timedelta(days=DATA_REFRESH_INTERVAL)):
+        return True
+    return False
+
+
+class PowershaperMeter:
+    """A single meter series on the Powershaper API, shared by every sensor that reads from it."""
+
+    def __init__(self, consent_uuid, meter_type, api_token, earliest_date, latest_date):
+        """Initialize a meter."""
+        self.consent_uuid = consent_uuid
+        self.meter_type = meter_type
+        self.api_token = api_token
+        self.earliest_date = earliest_date
+        self.latest_date = latest_date
+        self.last_refresh_date = datetime.now()
+        self.sensors = []
+        self.scheduler = PollScheduler()
+        self.next_poll = None
+        self.reconcile_cursor = None
+        # whether the API accepts polls starting at an hour rather than a day
+        self.hour_precision = True
+        self.gaps = GapIndex(timestamp_to_hour(earliest_date + "T00:00:00Z"))
+        self.next_gap_fill = None
+        # attempts at re-fetching each gap, by its first hour
+        self.gap_attempts = {}
+        # replaced by the saved index once the sensors are known, see PowershaperCoordinator.async_load_stored_data
+        self.usage = UsageIndex(())
+        # the columnar export file kept up to date with the usage index, if one was asked for
+        self.export_path = None
+        self.export_rewrite = False
+        self.backfill_progress = None
+        # whether the last update of the meter succeeded, its sensors are unavailable otherwise
+        self.available = True
+        self.metrics = MeterMetrics()
+        # held while the meter is updated or a file is imported into it
+        self.lock = asyncio.Lock()
+
+    @property
+    def key(self) -> str:
+        """Return a key identifying the meter within its config entry."""
+        return f"{self.consent_uuid}_{self.meter_type}"
+
+    def is_due(self, now) -> bool:
+        """Return whether the meter should be updated in a cycle starting at a given (UTC) time."""
+        return self.next_poll is None or self.next_poll <= now
+
+    @property
+    def fields(self) -> set[str]:
+        """Return every data field the sensors of this meter read from a data point."""
+        fields = set()
+        for sensor in self.sensors:
+            fields.add(sensor.data_key)
+            fields.update(sensor.extra_fields)
+        return fields
+
+    @property
+    def latest_timestamp(self):
+        """Return the timestamp up to which every sensor of this meter has been imported."""
+        timestamps = [sensor.latest_timestamp for sensor in self.sensors]
+        if None in timestamps:
+            return None
+        return min(timestamps)
+
+
+class PowershaperCoordinator(DataUpdateCoordinator):
+    """Fetch each meter's series once per cycle and fan the data points out to its sensors."""
+
+    def __init__(self, hass, entry_id, meters):
+        """Initialize the coordinator."""
+        super().__init__(hass, _LOGGER, name=DOMAIN, update_interval=SCAN_INTERVAL)
+        self.meters = meters
+        self.store = Store(hass, STORAGE_VERSION, f"{DOMAIN}.{entry_id}")
+        self.entry_id = entry_id
+        self._stored_data_loaded = False
+
+    @property
+    def sensors(self) -> list:
+        """Return the sensors of every meter."""
+        return [sensor for meter in self.meters for sensor in meter.sensors]
+
+    async def async_load_stored_data(self) -> None:
+        """Restore the digests and reconciliation cursors saved for the config entry."""
+        stored = await self.store.async_load() or {}
+
+        digests = stored.get("digests", {})
+        for sensor in self.sensors:
+            sensor.digests = DigestIndex(digests.get(sensor.statistic_id))
+
+        cursors = stored.get("reconcile_cursors", {})
+        gaps = stored.get("gaps", {})
+        exports = stored.get("exports", {})
+        for meter in self.meters:
+            meter.reconcile_cursor = cursors.get(meter.key)
+            meter.export_path = exports.get(meter.key)
+            if meter.key in gaps:
+                meter.gaps = GapIndex.from_dict(gaps[meter.key])
+            meter.usage = await self.hass.async_add_executor_job(
+                UsageIndex.load, usage_path(self.hass, self.entry_id, meter.key), meter.fields)
+
+        self._stored_data_loaded = True
+
+    async def async_save_usage(self) -> None:
+        """Save the usage indexes that changed since they were last saved."""
+        for meter in self.meters:
+            if meter.usage.changed:
+                await self.hass.async_add_executor_job(
+                    meter.usage.save, usage_path(self.hass, self.entry_id, meter.key))
+
+    async def async_sync_export(self, meter) -> None:
+        """Append the hours imported since to the export file of a meter, rewriting it if its hours changed."""
+        if meter.export_path is None:
+            return
+        try:
+            written = await self.hass.async_add_executor_job(
+                sync_export, meter.export_path, meter.usage.series, meter.export_rewrite)
+        except OSError as ex:
+            _LOGGER.warning(f"Unable to update the export of {meter.meter_type} meter at {meter.export_path}: {ex}")
+            return
+        meter.export_rewrite = False
+        if written:
+            _LOGGER.debug(f"Wrote {written} hour(s) of {meter.meter_type} meter to {meter.export_path}")
+
+    async def async_export_meter(self, meter, path: str, follow: bool = True) -> int:
+        """Write the imported series of a meter to an export file, returning its number of hours.
+
+        If follow is set, the hours imported from then on are appended to the file after every update.
+        """
+        async with meter.lock:
+            if not self._stored_data_loaded:
+                await self.async_load_stored_data()
+            await self.hass.async_add_executor_job(sync_export, path, meter.usage.series, True)
+            if follow:
+                meter.export_path, meter.export_rewrite = path, False
+            elif meter.export_path == path:
+                meter.export_path = None
+            self.store.async_delay_save(self._data_to_store, STORAGE_SAVE_DELAY)
+            return len(meter.usage)
+
+    def _data_to_store(self) -> dict[str, Any]:
+        """Return the data saved for the config entry."""
+        return {
+            "digests": {sensor.statistic_id: sensor.digests.as_dict() for sensor in self.sensors},
+            "reconcile_cursors": {meter.key: meter.reconcile_cursor for meter in self.meters},
+            "gaps": {meter.key: meter.gaps.as_dict() for meter in self.meters},
+            "exports": {meter.key: meter.export_path for meter in self.meters if meter.export_path},
+        }
+
+    async def _async_update_data(self) -> dict[str, Any]:
+        """Fetches historic data upon initialization, with subsequent polls for new data from the Powershaper API.
+
+        Only the meters that their poll scheduler considers due are polled, the next cycle is
+        scheduled for the earliest next poll of any meter.
+        """
+        errors = []
+        now = dt_util.utcnow()
+
+        if not self._stored_data_loaded:
+            await self.async_load_stored_data()
+
+        # meters are updated concurrently, their downloads share the global fetch semaphore,
+        # a meter still busy (e.g. with a long backfill or a file import) is left out of the cycle
+        due = [meter for meter in self.meters
+               if meter.is_due(now) and not meter.lock.locked()]
+        results = await asyncio.gather(
+            *(self.async_update_meter(meter) for meter in due), return_exceptions=True)
+
+        for meter, result in zip(due, results):
+            if isinstance(result, Exception):
+                _LOGGER.error(
+                    "Error updating %s meter of consent %s: %s", meter.meter_type, meter.consent_uuid, result)
+                meter.scheduler.record(dt_util.utcnow(), False)
+                meter.metrics.record_poll(POLL_OUTCOME_ERROR, dt_util.utcnow(), result)
+                errors.append(result)
+            meter.available = not isinstance(result, Exception)
+            meter.next_poll = meter.scheduler.next_poll(dt_util.utcnow())
+
+        self.store.async_delay_save(self._data_to_store, STORAGE_SAVE_DELAY)
+        await self.async_save_usage()
+        for meter in due:
+            if not meter.lock.locked():
+                await self.async_sync_export(meter)
+
+        if self.meters:
+            next_poll = min(meter.next_poll for meter in self.meters)
+            self.update_interval = max(
+                next_poll - dt_util.utcnow(), MIN_UPDATE_INTERVAL)
+
+        # a failing meter only makes its own sensors unavailable, the entry fails once none of them works
+        if errors and not any(meter.available for meter in self.meters):
+            raise UpdateFailed(f"Failed to update {len(errors)} meter(s)")
+
+        return {meter.key: meter.latest_timestamp for meter in self.meters}
+
+    async def async_restore_meter(self, meter) -> None:
+        """Restore the sensors of a meter that have not been imported into since the start from the recorder."""
+        for sensor in meter.sensors:
+            if (not sensor.initialized and sensor.latest_timestamp is None
+                    and await async_restore_from_recorder(self.hass, sensor)):
+                # data was imported before a restart, carry on polling from the last stored hour
+                sensor.initialized = True
+                _LOGGER.debug(
+                    f"Resuming {sensor.sensor_type} sensor from {sensor.latest_timestamp}")
+
+        if not meter.gaps and meter.latest_timestamp is not None:
+            # imported before gaps were tracked, the history is taken as complete
+            meter.gaps.mark_range(meter.gaps.origin, timestamp_to_hour(meter.latest_timestamp))
+
+    async def async_import_file(self, meter, path: str) -> int:
+        """Import an export file of a meter's hourly series, returning the number of hours imported.
+
+        Only the hours after what the sensors already hold are imported. Sensors that were not initialized yet
+        stay so, the next update fetches what the file is missing up to today from the API and polling carries on from there.
+        """
+        reader = ExportReader(path, meter.fields)
+        imported = 0
+
+        async with meter.lock:
+            if not self._stored_data_loaded:
+                await self.async_load_stored_data()
+            await self.async_restore_meter(meter)
+
+            await self.hass.async_add_executor_job(reader.open)
+            try:
+                while len(series := await self.hass.async_add_executor_job(reader.read_batch)):
+                    for sensor in meter.sensors:
+                        await async_import_new_data(self.hass, sensor, series)
+                    imported += len(series)
+            finally:
+                await self.hass.async_add_executor_job(reader.close)
+
+            if meter.latest_timestamp is not None:
+                meter.latest_date = meter.latest_timestamp[:10]
+            meter.next_poll = None
+            self.store.async_delay_save(self._data_to_store, STORAGE_SAVE_DELAY)
+            await self.async_save_usage()
+            await self.async_sync_export(meter)
+
+        _LOGGER.debug(f"Imported {imported} hours of {meter.meter_type} data from {path}")
+        await self.async_request_refresh()
+        return imported
+
+    async def async_update_meter(self, meter) -> None:
+        """Update every sensor of a meter with a single fetch of its series."""
+        async with meter.lock:
+            await self._async_update_meter(meter)
+
+    async def _async_update_meter(self, meter) -> None:
+        """Update a meter, with its lock held."""
+        await self.async_restore_meter(meter)
+
+        if historic_refresh(meter.last_refresh_date):
+            if all(sensor.initialized and sensor.digests for sensor in meter.sensors):
+                # re-check recent and sampled older days instead of re-importing everything
+                revised = await async_reconcile_meter(self.hass, meter)
+                meter.last_refresh_date = datetime.now()
+                _LOGGER.debug(
+                    f"Reconciled {meter.meter_type} meter, {revised} day(s) revised upstream")
+            else:
+                for sensor in meter.sensors:
+                    sensor.sum = 0
+                    sensor.latest_timestamp = None
+                    sensor.initialized = False
+                    sensor.digests.clear()
+                meter.gaps.clear()
+                meter.usage.clear()
+                meter.export_rewrite = True
+
+        uninitialized = [
+            sensor for sensor in meter.sensors if not sensor.initialized]
+
+        catch_up_date = str(date.today() - timedelta(days=BACKFILL_WINDOW_DAYS))
+
+        if (uninitialized or meter.latest_timestamp is None
+                or meter.latest_timestamp[:10] < catch_up_date):
+            # sensors that were already restored still receive the windows, but only import what is newer for them,
+            # a meter that fell more than a window behind (e.g. after a long downtime) catches up the same way,
+            # as does one whose backfill found no data yet, there is no hour to poll from
+            previous_timestamp = meter.latest_timestamp
+            await async_fetch_historic_data(self.hass, meter, meter.sensors, self.async_update_listeners)
+            new_data = meter.latest_timestamp != previous_timestamp
+            meter.metrics.record_poll(
+                POLL_OUTCOME_NEW_DATA if new_data else POLL_OUTCOME_EMPTY, dt_util.utcnow())
+            if not uninitialized:
+                meter.scheduler.record(dt_util.utcnow(), new_data)
+            for sensor in uninitialized:
+                sensor.initialized = True
+                _LOGGER.debug(
+                    f"Successfully imported historic {sensor.sensor_type} data")
+            if uninitialized:
+                meter.last_refresh_date = datetime.now()
+        else:
+            new_data = await async_poll_new_data(self.hass, meter)
+            meter.scheduler.record(dt_util.utcnow(), len(new_data) > 0)
+            meter.metrics.record_poll(
+                POLL_OUTCOME_NEW_DATA if len(new_data) else POLL_OUTCOME_EMPTY, dt_util.utcnow())
+            if len(new_data):
+                _LOGGER.debug(
+                    f"New data is available for {meter.meter_type} meter")
+                for sensor in meter.sensors:
+                    await async_import_new_data(self.hass, sensor, new_data)
+            else:
+                _LOGGER.debug(
+                    f"No new data available for {meter.meter_type}")
+
+            now = dt_util.utcnow()
+            if (meter.gaps.gap_count and all(sensor.digests for sensor in meter.sensors)
+                    and (meter.next_gap_fill is None or meter.next_gap_fill <= now)):
+                meter.next_gap_fill = now + GAP_FILL_INTERVAL
+                filled = await async_fill_gaps(self.hass, meter)
+                _LOGGER.debug(
+                    f"Filled {filled} missing hour(s) of {meter.meter_type} meter, {meter.gaps.gap_count} still missing")
+
+        if meter.latest_timestamp is not None:
+            meter.latest_date = meter.latest_timestamp[:10]
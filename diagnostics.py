@@ -0,0 +1,64 @@
+"""
+diagnostics.py - diagnostics of a config entry: what its requests, parsing and imports cost
+
+Authored by Robert Sahakyan
+"""
+
+from typing import Any
+from homeassistant.components.diagnostics import async_redact_data
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant
+from .api import async_get_request_scheduler
+from .const import DOMAIN
+from .series import hour_to_datetime
+from .timestamps import format_timestamp
+
+TO_REDACT = {"api_token", "consent_uuid"}
+# the first gaps of a meter listed in its diagnostics
+MISSING_RANGES_SHOWN = 20
+
+
+def meter_diagnostics(meter) -> dict[str, Any]:
+    """Return the state, poll schedule and metrics of a meter and its sensors."""
+    return {
+        "consent_uuid": meter.consent_uuid,
+        "meter_type": meter.meter_type,
+        "earliest_date": meter.earliest_date,
+        "latest_date": meter.latest_date,
+        "latest_timestamp": meter.latest_timestamp,
+        "backfill_progress": meter.backfill_progress,
+        "next_poll": meter.next_poll.isoformat() if meter.next_poll else None,
+        "dense_hours": sorted(meter.scheduler.dense_hours()),
+        "empty_polls": meter.scheduler.empty_polls,
+        "gaps": meter.gaps.gap_count,
+        "missing_ranges": [[format_timestamp(hour_to_datetime(first)), format_timestamp(hour_to_datetime(last))]
+                           for first, last in meter.gaps.missing_ranges()[:MISSING_RANGES_SHOWN]],
+        "metrics": meter.metrics.as_dict(),
+        "sensors": [{
+            "statistic_id": sensor.statistic_id,
+            "initialized": sensor.initialized,
+            "latest_timestamp": sensor.latest_timestamp,
+            "sum": sensor.sum,
+            "digest_days": len(sensor.digests.days),
+        } for sensor in meter.sensors],
+    }
+
+
+async def async_get_config_entry_diagnostics(hass: HomeAssistant, entry: ConfigEntry) -> dict[str, Any]:
+    """Return the diagnostics of a config entry."""
+    diagnostics = {"entry": async_redact_data(entry.as_dict(), TO_REDACT)}
+
+    coordinator = hass.data.get(DOMAIN, {}).get(entry.entry_id, {}).get("coordinator")
+    if coordinator is None:
+        return diagnostics
+
+    scheduler = async_get_request_scheduler(hass, entry.data['api_token'])
+    diagnostics["requests"] = scheduler.metrics.as_dict()
+    diagnostics["coordinator"] = {
+        "last_update_success": coordinator.last_update_success,
+        "update_interval": str(coordinator.update_interval),
+    }
+    diagnostics["meters"] = async_redact_data(
+        [meter_diagnostics(meter) for meter in coordinator.meters], TO_REDACT)
+
+    return diagnostics
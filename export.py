@@ -0,0 +1,265 @@
+"""
+export.py - columnar export files of the hourly series imported for a meter, read back by memory-mapping
+
+Authored by Robert Sahakyan
+"""
+
+from array import array
+from bisect import bisect_left, bisect_right
+import json
+import logging
+import mmap
+import os
+import struct
+import tempfile
+from typing import Iterable
+from .const import EXPORT_HEADROOM_HOURS
+
+_LOGGER = logging.getLogger(__name__)
+
+EXPORT_SUFFIX = ".columns"
+EXPORT_MAGIC = b"PSCOLS\x00\x01"
+
+# magic, header size, capacity, length, first and last epoch hour (-1 while empty), then the fields as JSON
+_HEADER = struct.Struct("<8sIQQqq")
+CUMULATIVE_SUFFIX = "_cumulative"
+
+
+def export_columns(fields: Iterable[str]) -> list[str]:
+    """Return the columns of an export of some fields, in file order: hours, then every field and its cumulative sum."""
+    columns = ["hours"]
+    for field in fields:
+        columns.extend((field, field + CUMULATIVE_SUFFIX))
+    return columns
+
+
+class ExportHeader:
+    """The header of an export file: its fields, where its columns start and how many hours they hold.
+
+    Each column is an array of capacity little endian 64 bit slots (int64 epoch hours, float64 values),
+    so new hours are written past the last one of every column without moving the others.
+    """
+
+    def __init__(self, fields: Iterable[str], capacity: int, length: int = 0, first_hour: int = -1,
+                 last_hour: int = -1):
+        """Initialize the header of a file of some fields."""
+        self.fields = tuple(fields)
+        self.capacity = capacity
+        self.length = length
+        self.first_hour = first_hour
+        self.last_hour = last_hour
+        fields_json = json.dumps(self.fields).encode()
+        # the columns start 8 byte aligned, so they can be cast from a memory map in place
+        self.size = -(-(_HEADER.size + len(fields_json)) // 8) * 8
+        self._fields_json = fields_json
+
+    @property
+    def columns(self) -> list[str]:
+        """Return the columns of the file, in order."""
+        return export_columns(self.fields)
+
+    def offset(self, column: str) -> int:
+        """Return the offset of the first slot of a column."""
+        return self.size + self.columns.index(column) * self.capacity * 8
+
+    @property
+    def file_size(self) -> int:
+        """Return the size of a file with this header."""
+        return self.size + len(self.columns) * self.capacity * 8
+
+    def pack(self) -> bytes:
+        """Return the header as written at the start of the file."""
+        packed = _HEADER.pack(EXPORT_MAGIC, self.size, self.capacity, self.length, self.first_hour,
+                              self.last_hour) + self._fields_json
+        return packed.ljust(self.size, b"\x00")
+
+    @classmethod
+    def read(cls, file) -> "ExportHeader":
+        """Read the header at the start of an open file, raising ValueError if it is not an export file."""
+        magic, size, capacity, length, first_hour, last_hour = _HEADER.unpack(file.read(_HEADER.size))
+        if magic != EXPORT_MAGIC:
+            raise ValueError("not a Powershaper export file")
+        fields = json.loads(file.read(size - _HEADER.size).rstrip(b"\x00"))
+        return cls(fields, capacity, length, first_hour, last_hour)
+
+
+def write_export(path: str, series) -> None:
+    """Write the whole of a series to an export file, with room for EXPORT_HEADROOM_HOURS more, blocking."""
+    length = len(series)
+    header = ExportHeader(series.fields, length + EXPORT_HEADROOM_HOURS, length,
+                          series.first_hour if length else -1, series.last_hour if length else -1)
+
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    descriptor, temporary = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    with os.fdopen(descriptor, "wb") as exported:
+        exported.write(header.pack())
+        for column in header.columns:
+            exported.seek(header.offset(column))
+            exported.write(_column_of(series, column).tobytes())
+        # the free slots are left as a hole rather than written
+        exported.truncate(header.file_size)
+    os.replace(temporary, path)
+
+
+def append_export(path: str, series):
+    """Append the hours of a series newer than the last hour of an export file, blocking.
+
+    Returns how many hours were appended, None if they do not fit in the free slots of the file
+    or it holds other fields, in which case it has to be rewritten.
+    """
+    with open(path, "r+b") as exported:
+        header = ExportHeader.read(exported)
+        start = 0 if header.length == 0 else bisect_right(series.hours, header.last_hour)
+        new_hours = len(series) - start
+        if header.fields != tuple(series.fields) or header.length + new_hours > header.capacity:
+            return None
+        if new_hours <= 0:
+            return 0
+
+        exported.seek(header.offset("hours") + header.length * 8)
+        exported.write(series.hours[start:].tobytes())
+        for field in header.fields:
+            values = series.values[field][start:]
+            exported.seek(header.offset(field) + header.length * 8)
+            exported.write(values.tobytes())
+
+            # the cumulative sum carries on from the last one of the file
+            total = 0.0
+            if header.length:
+                exported.seek(header.offset(field + CUMULATIVE_SUFFIX) + (header.length - 1) * 8)
+                total = struct.unpack("<d", exported.read(8))[0]
+            cumulative = array('d')
+            for value in values:
+                total += value
+                cumulative.append(total)
+            exported.seek(header.offset(field + CUMULATIVE_SUFFIX) + header.length * 8)
+            exported.write(cumulative.tobytes())
+
+        # the header is written last, a reader never counts hours that are not written yet
+        if header.length == 0:
+            header.first_hour = series.hours[start]
+        header.length += new_hours
+        header.last_hour = series.hours[-1]
+        exported.seek(0)
+        exported.write(header.pack())
+
+    return new_hours
+
+
+def sync_export(path: str, series, rewrite: bool = False) -> int:
+    """Bring an export file up to date with a series, returning the number of hours written, blocking.
+
+    New hours are appended in place. The file is rewritten when asked to (e.g. after hours before its last one were
+    replaced), when it is full, missing or unreadable.
+    """
+    if not rewrite:
+        try:
+            appended = append_export(path, series)
+        except FileNotFoundError:
+            appended = None
+        except (OSError, ValueError, struct.error) as ex:
+            _LOGGER.warning(f"Unable to append to the export {path}, rewriting it: {ex}")
+            appended = None
+        if appended is not None:
+            return appended
+
+    write_export(path, series)
+    return len(series)
+
+
+def _column_of(series, column: str) -> array:
+    """Return a column of a series by its name in an export file."""
+    if column == "hours":
+        return series.hours
+    if column.endswith(CUMULATIVE_SUFFIX):
+        return series.cumulative[column[:-len(CUMULATIVE_SUFFIX)]]
+    return series.values[column]
+
+
+class ColumnarReader:
+    """An export file mapped into memory, its columns read in place as typed memoryviews.
+
+    Slices are found by binary search on the hours column, without reading the hours before them.
+    The views it returns are only valid until the reader is closed.
+    """
+
+    def __init__(self, path: str):
+        """Initialize a reader of an export file."""
+        self.path = path
+        self.header = None
+        self._file = None
+        self._map = None
+        self._views = []
+
+    def __enter__(self) -> "ColumnarReader":
+        """Open the file when entering a with block."""
+        self.open()
+        return self
+
+    def __exit__(self, *args) -> None:
+        """Close the file when leaving a with block."""
+        self.close()
+
+    def open(self) -> None:
+        """Open and map the file."""
+        self._file = open(self.path, "rb")
+        try:
+            self.header = ExportHeader.read(self._file)
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except Exception:
+            self._file.close()
+            raise
+
+    def close(self) -> None:
+        """Release the views handed out, then unmap and close the file."""
+        for view in self._views:
+            view.release()
+        self._views.clear()
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __len__(self) -> int:
+        """Return the number of hours in the file."""
+        return self.header.length
+
+    @property
+    def fields(self) -> tuple:
+        """Return the fields of the file."""
+        return self.header.fields
+
+    def column(self, column: str, start: int = 0, stop: int = None) -> memoryview:
+        """Return the slots start -> stop of a column (hours, a field or a field's cumulative sum) in place."""
+        stop = self.header.length if stop is None else min(stop, self.header.length)
+        offset = self.header.offset(column)
+        raw = memoryview(self._map)[offset + start * 8:offset + max(stop, start) * 8]
+        view = raw.cast("q" if column == "hours" else "d")
+        self._views.extend((view, raw))
+        return view
+
+    def hour_range(self, first_hour: int, last_hour: int) -> tuple[int, int]:
+        """Return the start and stop slots of the epoch hours from first_hour to last_hour (inclusive)."""
+        hours = self.column("hours")
+        return bisect_left(hours, first_hour), bisect_right(hours, last_hour)
+
+    def slice(self, first_hour: int, last_hour: int) -> dict[str, memoryview]:
+        """Return every column over the epoch hours from first_hour to last_hour (inclusive)."""
+        start, stop = self.hour_range(first_hour, last_hour)
+        return {column: self.column(column, start, stop) for column in self.header.columns}
+
+    def total(self, field: str, first_hour: int, last_hour: int) -> float:
+        """Return the sum of a field over the epoch hours from first_hour to last_hour (inclusive)."""
+        start, stop = self.hour_range(first_hour, last_hour)
+        if stop <= start:
+            return 0.0
+        cumulative = self.column(field + CUMULATIVE_SUFFIX)
+        return cumulative[stop - 1] - (cumulative[start - 1] if start else 0.0)
+
+
+def export_path(directory: str, meter_key: str) -> str:
+    """Return the export file of a meter in a directory."""
+    return os.path.join(directory, f"{meter_key}{EXPORT_SUFFIX}")
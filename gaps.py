@@ -0,0 +1,132 @@
+"""
+gaps.py - a bitmap of the hours imported for a meter, to find the hours missing from its series
+
+Authored by Robert Sahakyan
+"""
+
+import base64
+from typing import Any, Iterable
+import zlib
+
+
+class GapIndex:
+    """One bit per hour since an origin epoch hour, set once the hour has been imported.
+
+    Gaps are the unset hours between the first and the last imported hour.
+    """
+
+    def __init__(self, origin: int, bitmap: bytes = b""):
+        """Initialize the index of hours counted from an origin epoch hour."""
+        self.origin = origin
+        self.bits = bytearray(bitmap)
+        self.first = None
+        self.last = None
+        self._update_bounds()
+
+    def __bool__(self) -> bool:
+        """Return whether any hour has been marked."""
+        return self.last is not None
+
+    def _update_bounds(self) -> None:
+        """Find the first and last marked hours in the bitmap."""
+        self.first = self.last = None
+        for index, byte in enumerate(self.bits):
+            if byte:
+                self.first = self.origin + index * 8 + (byte & -byte).bit_length() - 1
+                break
+        for index in range(len(self.bits) - 1, -1, -1):
+            byte = self.bits[index]
+            if byte:
+                self.last = self.origin + index * 8 + byte.bit_length() - 1
+                break
+
+    def clear(self) -> None:
+        """Forget every marked hour, e.g. before a full re-import."""
+        self.bits.clear()
+        self.first = self.last = None
+
+    def mark_range(self, first_hour: int, last_hour: int) -> None:
+        """Mark the epoch hours from first_hour to last_hour (inclusive) as imported."""
+        start = max(first_hour - self.origin, 0)
+        stop = last_hour - self.origin + 1
+        if stop <= start:
+            return
+
+        if len(self.bits) * 8 < stop:
+            self.bits.extend(bytes((stop + 7) // 8 - len(self.bits)))
+
+        # the whole bytes of the range at once, the bits at either end one by one
+        first_byte, last_byte = (start + 7) // 8, stop // 8
+        if first_byte < last_byte:
+            self.bits[first_byte:last_byte] = b"\xff" * (last_byte - first_byte)
+            edges = list(range(start, first_byte * 8)) + list(range(last_byte * 8, stop))
+        else:
+            edges = range(start, stop)
+        for offset in edges:
+            self.bits[offset >> 3] |= 1 << (offset & 7)
+
+        first_hour, last_hour = self.origin + start, self.origin + stop - 1
+        self.first = first_hour if self.first is None else min(self.first, first_hour)
+        self.last = last_hour if self.last is None else max(self.last, last_hour)
+
+    def mark(self, hours: Iterable[int]) -> None:
+        """Mark the (ascending) epoch hours of a series as imported."""
+        run_start = run_end = None
+        for hour in hours:
+            if run_end is not None and hour == run_end + 1:
+                run_end = hour
+                continue
+            if run_start is not None:
+                self.mark_range(run_start, run_end)
+            run_start = run_end = hour
+        if run_start is not None:
+            self.mark_range(run_start, run_end)
+
+    def is_marked(self, hour: int) -> bool:
+        """Return whether an epoch hour has been imported."""
+        offset = hour - self.origin
+        if offset < 0 or offset >= len(self.bits) * 8:
+            return False
+        return bool(self.bits[offset >> 3] & (1 << (offset & 7)))
+
+    @property
+    def gap_count(self) -> int:
+        """Return the number of hours missing between the first and the last imported hour."""
+        if self.last is None:
+            return 0
+        return self.last - self.first + 1 - int.from_bytes(self.bits, "little").bit_count()
+
+    def missing_ranges(self) -> list[tuple[int, int]]:
+        """Return the (first, last) epoch hours of every gap, in order."""
+        ranges = []
+        if self.last is None:
+            return ranges
+
+        gap_start = None
+        first_offset, last_offset = self.first - self.origin, self.last - self.origin
+        offset = first_offset
+        while offset <= last_offset:
+            byte = self.bits[offset >> 3]
+            # skip whole bytes of imported hours
+            if byte == 0xff and offset & 7 == 0 and gap_start is None:
+                offset += 8
+                continue
+            if byte & (1 << (offset & 7)):
+                if gap_start is not None:
+                    ranges.append((self.origin + gap_start, self.origin + offset - 1))
+                    gap_start = None
+            elif gap_start is None:
+                gap_start = offset
+            offset += 1
+
+        return ranges
+
+    def as_dict(self) -> dict[str, Any]:
+        """Return the index in a form that can be stored as JSON."""
+        return {"origin": self.origin,
+                "bitmap": base64.b64encode(zlib.compress(bytes(self.bits))).decode()}
+
+    @classmethod
+    def from_dict(cls, stored: dict[str, Any]) -> "GapIndex":
+        """Return an index from its stored form."""
+        return cls(stored["origin"], zlib.decompress(base64.b64decode(stored["bitmap"])))
@@ -0,0 +1,71 @@
+"""
+meter_cache.py - the meters listed for an API token, cached in the config entry so setup needs no API call
+
+Authored by Robert Sahakyan
+"""
+
+import asyncio
+from datetime import datetime
+import logging
+from typing import Any
+from aiohttp.client_exceptions import ClientError
+from homeassistant.exceptions import HomeAssistantError
+from homeassistant.util import dt as dt_util
+from .const import (POWERSHAPER_AUTH_URL,
+                    CONF_METERS,
+                    CONF_METERS_UPDATED,
+                    METERS_CACHE_TTL)
+from .coordinator import METER_TYPE_KEYS, async_fetch_data, meters_from_response
+
+_LOGGER = logging.getLogger(__name__)
+
+# what is kept of each meter listed by the meters endpoint
+CACHED_METER_KEYS = ("consent_uuid", "range") + METER_TYPE_KEYS
+
+
+def cacheable_meters(response_data: list[dict[str, Any]]) -> list[dict[str, Any]]:
+    """Return the part of a meters response that the sensors are built from."""
+    return [{key: meter_data[key] for key in CACHED_METER_KEYS if key in meter_data}
+            for meter_data in response_data]
+
+
+def entry_data_with_meters(data: dict[str, Any], response_data: list[dict[str, Any]]) -> dict[str, Any]:
+    """Return the data of a config entry with the meters of a meters response cached in it."""
+    return {**data,
+            CONF_METERS: cacheable_meters(response_data),
+            CONF_METERS_UPDATED: dt_util.utcnow().isoformat()}
+
+
+def meters_cache_expired(entry) -> bool:
+    """Return whether the meters cached in a config entry are older than METERS_CACHE_TTL."""
+    updated = entry.data.get(CONF_METERS_UPDATED)
+    if CONF_METERS not in entry.data or updated is None:
+        return True
+    return dt_util.utcnow() - datetime.fromisoformat(updated) >= METERS_CACHE_TTL
+
+
+async def async_fetch_meters(hass, entry) -> list[dict[str, Any]]:
+    """Fetch the meters of the API token of a config entry and cache them in the entry."""
+    response_data = await async_fetch_data(hass, entry.data['api_token'], POWERSHAPER_AUTH_URL)
+    hass.config_entries.async_update_entry(
+        entry, data=entry_data_with_meters(entry.data, response_data))
+    return entry.data[CONF_METERS]
+
+
+async def async_refresh_meters(hass, entry) -> None:
+    """Refresh the cached meters of a config entry, reloading it when meters were added or removed.
+
+    Failures are only logged, the entry carries on with the meters it has cached.
+    """
+    api_token = entry.data['api_token']
+    cached = {meter.key for meter in meters_from_response(entry.data.get(CONF_METERS, []), api_token)}
+
+    try:
+        meters_data = await async_fetch_meters(hass, entry)
+    except (HomeAssistantError, ClientError, asyncio.TimeoutError) as ex:
+        _LOGGER.warning(f"Unable to refresh the meters from the Powershaper API, using the cached meters: {ex}")
+        return
+
+    if {meter.key for meter in meters_from_response(meters_data, api_token)} != cached:
+        _LOGGER.debug("The meters of the API token changed, reloading the entry")
+        hass.async_create_task(hass.config_entries.async_reload(entry.entry_id))
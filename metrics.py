@@ -0,0 +1,137 @@
+"""
+metrics.py - what the requests, parsing and imports of the integration cost, for its diagnostics
+
+Authored by Robert Sahakyan
+"""
+
+from collections import deque
+import time
+from typing import Any
+from .const import QUOTA_STATUSES
+
+# calls are counted over a sliding window of this many seconds
+CALL_RATE_WINDOW = 3600
+
+
+class RequestMetrics:
+    """Latency, size and rate of the requests sent with one API token."""
+
+    def __init__(self):
+        """Initialize the metrics with nothing recorded."""
+        self.requests = 0
+        self.failures = 0
+        self.throttled = 0
+        self.coalesced = 0
+        self.bytes_received = 0
+        self.bytes_decoded = 0
+        self.latency_total = 0.0
+        self.last_latency = None
+        self.last_bytes = None
+        self._call_times = deque()
+
+    def _count_call(self) -> None:
+        """Count a call in the sliding window of calls."""
+        now = time.monotonic()
+        self._call_times.append(now)
+        while self._call_times[0] < now - CALL_RATE_WINDOW:
+            self._call_times.popleft()
+
+    def record_response(self, status: int, latency: float) -> None:
+        """Record a response, received latency seconds after its request was sent."""
+        self._count_call()
+        self.requests += 1
+        self.latency_total += latency
+        self.last_latency = latency
+        if status in QUOTA_STATUSES:
+            self.throttled += 1
+        elif status != 200:
+            self.failures += 1
+
+    def record_failure(self) -> None:
+        """Record a request that got no response, e.g. a timeout or a connection error."""
+        self._count_call()
+        self.failures += 1
+
+    def record_coalesced(self) -> None:
+        """Record a request answered by an identical request already in flight, rather than sent."""
+        self.coalesced += 1
+
+    def record_bytes(self, size: int, decoded: int) -> None:
+        """Record the size of a response body on the wire, and once decompressed."""
+        self.bytes_received += size
+        self.bytes_decoded += decoded
+        self.last_bytes = size
+
+    @property
+    def calls_per_hour(self) -> int:
+        """Return the number of calls made over the last hour."""
+        now = time.monotonic()
+        return sum(1 for call_time in self._call_times if call_time >= now - CALL_RATE_WINDOW)
+
+    @property
+    def average_latency(self):
+        """Return the average latency (s) of the responses, None before the first one."""
+        return self.latency_total / self.requests if self.requests else None
+
+    def as_dict(self) -> dict[str, Any]:
+        """Return the metrics in a form that can be shown in the diagnostics."""
+        return {
+            "requests": self.requests,
+            "failures": self.failures,
+            "throttled": self.throttled,
+            "coalesced": self.coalesced,
+            "calls_per_hour": self.calls_per_hour,
+            "bytes_received": self.bytes_received,
+            "bytes_decoded": self.bytes_decoded,
+            "last_bytes": self.last_bytes,
+            "last_latency": self.last_latency,
+            "average_latency": self.average_latency,
+        }
+
+
+class MeterMetrics:
+    """What parsing and importing the series of one meter has cost, and how its last poll went."""
+
+    def __init__(self):
+        """Initialize the metrics with nothing recorded."""
+        self.points_parsed = 0
+        self.parse_time = 0.0
+        self.points_imported = 0
+        self.import_time = 0.0
+        self.cache_hits = 0
+        self.last_poll = None
+        self.last_poll_time = None
+        self.last_error = None
+
+    def record_parse(self, points: int, seconds: float) -> None:
+        """Record points decoded from a response."""
+        self.points_parsed += points
+        self.parse_time += seconds
+
+    def record_import(self, points: int, seconds: float) -> None:
+        """Record points handed to the recorder."""
+        self.points_imported += points
+        self.import_time += seconds
+
+    def record_cache_hit(self) -> None:
+        """Record a window read from the response cache instead of the API."""
+        self.cache_hits += 1
+
+    def record_poll(self, outcome: str, when, error: Exception = None) -> None:
+        """Record the outcome (new data, empty or error) of an update of the meter."""
+        self.last_poll = outcome
+        self.last_poll_time = when
+        self.last_error = None if error is None else str(error)
+
+    def as_dict(self) -> dict[str, Any]:
+        """Return the metrics in a form that can be shown in the diagnostics."""
+        return {
+            "points_parsed": self.points_parsed,
+            "parse_time": self.parse_time,
+            "points_imported": self.points_imported,
+            "import_time": self.import_time,
+            "cache_hits": self.cache_hits,
+            "last_poll": self.last_poll,
+            "last_poll_time": self.last_poll_time.isoformat() if self.last_poll_time else None,
+            "last_error": self.last_error,
+        }
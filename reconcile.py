@@ -0,0 +1,92 @@
+"""
+reconcile.py - per day digests of the imported statistics, used to spot upstream revisions
+
+Authored by Robert Sahakyan
+"""
+
+import zlib
+from .series import MeterSeries
+
+
+def day_digests(series: MeterSeries, field: str) -> dict[int, list]:
+    """Return the [count, total, hash] of a field for each epoch day of a series."""
+    digests = {}
+    values = series.values[field]
+
+    for day, start, stop in series.day_ranges():
+        day_values = values[start:stop]
+        digests[day] = [stop - start, sum(day_values), zlib.crc32(day_values.tobytes())]
+
+    return digests
+
+
+class DigestIndex:
+    """The per day digest of what has been imported for a sensor: [count, total, hash, cumulative sum at the end of the day].
+
+    Hours are imported in order, so the hash of a day is extended with crc32 as the day fills up.
+    """
+
+    def __init__(self, days: dict = None):
+        """Initialize the index, optionally from its stored form."""
+        self.days = {int(day): digest for day, digest in (days or {}).items()}
+
+    def __bool__(self) -> bool:
+        """Return whether anything has been recorded."""
+        return bool(self.days)
+
+    def as_dict(self) -> dict[str, list]:
+        """Return the index in a form that can be stored as JSON."""
+        return {str(day): digest for day, digest in self.days.items()}
+
+    def clear(self) -> None:
+        """Forget every digest, e.g. before a full re-import."""
+        self.days.clear()
+
+    def record(self, series: MeterSeries, field: str, base_sum: float) -> None:
+        """Record a series that was imported with its sums carried on from base_sum."""
+        values = series.values[field]
+        cumulative = series.cumulative[field]
+
+        for day, start, stop in series.day_ranges():
+            day_values = values[start:stop]
+            digest = self.days.get(day)
+            if digest is None:
+                digest = self.days[day] = [0, 0.0, 0, 0.0]
+            digest[0] += stop - start
+            digest[1] += sum(day_values)
+            digest[2] = zlib.crc32(day_values.tobytes(), digest[2])
+            digest[3] = base_sum + cumulative[stop - 1]
+
+    def cumulative_before(self, day: int) -> float:
+        """Return the cumulative sum at the end of the last recorded day before a given epoch day."""
+        earlier = [other for other in self.days if other < day]
+        return self.days[max(earlier)][3] if earlier else 0.0
+
+    def changed_days(self, digests: dict[int, list]) -> list[int]:
+        """Return, in order, the days whose freshly fetched [count, total, hash] differs from what was imported."""
+        changed = []
+        for day, (count, _, digest) in sorted(digests.items()):
+            recorded = self.days.get(day)
+            if recorded is None or recorded[0] != count or recorded[2] != digest:
+                changed.append(day)
+        return changed
+
+    def replace_day(self, day: int, digest: list, base_sum: float) -> float:
+        """Replace the digest of a re-imported day and shift the cumulative sums of every later day.
+
+        Returns the change of the cumulative sum at the end of the day.
+        """
+        count, total, day_hash = digest
+        previous = self.days.get(day)
+        previous_cumulative = previous[3] if previous else base_sum
+        cumulative = base_sum + total
+        delta = cumulative - previous_cumulative
+
+        self.days[day] = [count, total, day_hash, cumulative]
+        if delta:
+            for other, other_digest in self.days.items():
+                if other > day:
+                    other_digest[3] += delta
+
+        return delta
+
@@ -0,0 +1,138 @@
+"""
+response_cache.py - compressed on-disk cache of the series of closed windows, which practically never change
+
+Authored by Robert Sahakyan
+"""
+
+from datetime import date
+import logging
+import os
+import tempfile
+import zlib
+from typing import Iterable
+from homeassistant.helpers.storage import STORAGE_DIR
+from .const import DATA_SHARED, DOMAIN, RESPONSE_CACHE_MAX_BYTES, RESPONSE_CACHE_MIN_AGE_DAYS
+from .series import MeterSeries
+
+_LOGGER = logging.getLogger(__name__)
+
+CACHE_SUFFIX = ".series.z"
+
+
+def window_is_closed(end_date: str, today: date = None) -> bool:
+    """Return whether a window ending on a day (YYYY-MM-DD) is old enough to be cached."""
+    today = today or date.today()
+    return (today - date.fromisoformat(end_date)).days >= RESPONSE_CACHE_MIN_AGE_DAYS
+
+
+class ResponseCache:
+    """Series of closed windows kept as zlib compressed files, one per consent, meter type, window and aggregate.
+
+    Files are evicted least recently used first once they take more than max_bytes. Every method
+    does blocking file I/O and is meant to run in the executor.
+    """
+
+    def __init__(self, directory: str, max_bytes: int = RESPONSE_CACHE_MAX_BYTES):
+        """Initialize a cache kept in a directory."""
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    def path(self, consent_uuid: str, meter_type: str, start_date: str, end_date: str, aggregate: str) -> str:
+        """Return the file of a window."""
+        return os.path.join(self.directory,
+                            f"{consent_uuid}_{meter_type}_{start_date}_{end_date}_{aggregate}{CACHE_SUFFIX}")
+
+    def get(self, consent_uuid: str, meter_type: str, start_date: str, end_date: str, aggregate: str,
+            fields: Iterable[str]):
+        """Return the cached series of a window, None if it is not cached or lacks one of the fields."""
+        path = self.path(consent_uuid, meter_type, start_date, end_date, aggregate)
+        try:
+            with open(path, "rb") as cached:
+                series = MeterSeries.from_bytes(zlib.decompress(cached.read()))
+            # the modification time orders the files for eviction
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, zlib.error) as ex:
+            _LOGGER.debug(f"Dropping unreadable cache file {path}: {ex}")
+            self._remove(path)
+            return None
+
+        if not set(fields) <= set(series.fields):
+            return None
+        return series
+
+    def put(self, consent_uuid: str, meter_type: str, start_date: str, end_date: str, aggregate: str,
+            series: MeterSeries) -> None:
+        """Cache the series of a window, then evict what is over the size limit."""
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.path(consent_uuid, meter_type, start_date, end_date, aggregate)
+        # written to a temporary file first, so a concurrent get never reads half a file
+        descriptor, temporary = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(descriptor, "wb") as cached:
+            cached.write(zlib.compress(series.to_bytes()))
+        os.replace(temporary, path)
+
+        self.evict()
+
+    def invalidate(self, consent_uuid: str, meter_type: str, days: Iterable[date]) -> int:
+        """Remove the windows of a meter that cover any of the given days, returning how many were removed."""
+        days = list(days)
+        prefix = f"{consent_uuid}_{meter_type}_"
+        removed = 0
+
+        for name in self._names():
+            if not name.startswith(prefix):
+                continue
+            start_date, end_date = name[len(prefix):].split("_")[:2]
+            if any(start_date <= str(day) <= end_date for day in days):
+                self._remove(os.path.join(self.directory, name))
+                removed += 1
+
+        return removed
+
+    def evict(self) -> None:
+        """Remove the least recently used files until the cache fits in max_bytes."""
+        files = []
+        for name in self._names():
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+
+        size = sum(file_size for _, file_size, _ in files)
+        for _, file_size, path in sorted(files):
+            if size <= self.max_bytes:
+                break
+            self._remove(path)
+            size -= file_size
+
+    def _names(self) -> list[str]:
+        """Return the names of the cached files."""
+        try:
+            return [name for name in os.listdir(self.directory) if name.endswith(CACHE_SUFFIX)]
+        except FileNotFoundError:
+            return []
+
+    @staticmethod
+    def _remove(path: str) -> None:
+        """Remove a cached file, if it is still there."""
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def async_get_response_cache(hass) -> ResponseCache:
+    """Return the response cache shared by every config entry, kept in Home Assistant's storage directory.
+
+    It is keyed by consent rather than by entry, so it outlives removing and adding the integration again.
+    """
+    shared_data = hass.data.setdefault(DATA_SHARED, {})
+
+    if "response_cache" not in shared_data:
+        shared_data["response_cache"] = ResponseCache(hass.config.path(STORAGE_DIR, f"{DOMAIN}_cache"))
+
+    return shared_data["response_cache"]
@@ -0,0 +1,79 @@
+"""
+scheduler.py - decide when to poll a meter, based on when its new data has been published before
+
+Authored by Robert Sahakyan
+"""
+
+from datetime import datetime, timedelta
+from .const import (POLL_INTERVAL_DENSE,
+                    POLL_INTERVAL_DEFAULT,
+                    POLL_INTERVAL_MAX,
+                    POLL_MIN_OBSERVATIONS)
+
+# weight kept by older observations each time new data is seen, so the schedule follows changes in publication
+ARRIVAL_DECAY = 0.9
+# hours seeing at least this share of the busiest hour's arrivals are polled densely
+DENSE_THRESHOLD = 0.25
+# until an arrival hour has been learned, this many empty polls are tolerated before backing off
+EMPTY_POLLS_BEFORE_BACKOFF = 24
+
+
+class PollScheduler:
+    """Learns at which hours of the day (UTC) new data for a meter shows up.
+
+    Polls densely around those hours and sparsely otherwise, backing off while polls keep coming back empty.
+    """
+
+    def __init__(self):
+        """Initialize a scheduler with nothing learned yet."""
+        self.arrivals = [0.0] * 24
+        self.observations = 0
+        self.empty_polls = 0
+
+    def record(self, now: datetime, new_data: bool) -> None:
+        """Record the outcome of a poll made at a given (UTC) time."""
+        if not new_data:
+            self.empty_polls += 1
+            return
+
+        self.arrivals = [weight * ARRIVAL_DECAY for weight in self.arrivals]
+        self.arrivals[now.hour] += 1
+        self.observations += 1
+        self.empty_polls = 0
+
+    def dense_hours(self) -> set[int]:
+        """Return the hours of the day to poll densely, including the hour before each learned arrival hour."""
+        if self.observations < POLL_MIN_OBSERVATIONS:
+            return set()
+
+        peak = max(self.arrivals)
+        hours = {hour for hour, weight in enumerate(self.arrivals)
+                 if weight >= peak * DENSE_THRESHOLD}
+
+        return hours | {(hour - 1) % 24 for hour in hours}
+
+    def next_poll(self, now: datetime) -> datetime:
+        """Return when the meter should next be polled after a poll at a given (UTC) time."""
+        dense_hours = self.dense_hours()
+
+        if now.hour in dense_hours and self.empty_polls:
+            return now + POLL_INTERVAL_DENSE
+
+        empty_polls = self.empty_polls
+        if not dense_hours:
+            # nothing learned yet, a day of empty polls is tolerated before backing off
+            empty_polls = max(empty_polls - EMPTY_POLLS_BEFORE_BACKOFF, 0)
+
+        backoff = min(POLL_INTERVAL_DEFAULT * 2 ** empty_polls, POLL_INTERVAL_MAX)
+        next_poll = now + backoff
+
+        # never sleep through the start of a dense window
+        hour_start = now.replace(minute=0, second=0, microsecond=0)
+        for hours_ahead in range(1, 25):
+            window_start = hour_start + timedelta(hours=hours_ahead)
+            if window_start >= next_poll:
+                break
+            if window_start.hour in dense_hours:
+                return window_start
+
+        return next_poll
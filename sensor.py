@@ -4,36 +4,38 @@ sensor.py - setup the home assistant sensors for pulling metering data from powe
 Authored by Robert Sahakyan
 """
 
-from collections import namedtuple
+import asyncio
+from collections import Counter
 import logging
-import pytz
-from typing import Any, NamedTuple
-from datetime import datetime, timedelta, date
 from .const import (DOMAIN,
-                    POWERSHAPER_AUTH_URL,
-                    POWERSHAPER_BASE_SENSOR_URL,
+                    CONF_METERS,
+                    CONF_PRIMARY_CONSENTS,
+                    METERS_CACHE_TTL,
                     ICON_GAS_METER,
                     ICON_ELECTRICITY_METER,
                     ICON_MOLECULE_CO2,
                     SENSOR_TYPE_GAS,
                     SENSOR_TYPE_ELECTRICITY,
                     SENSOR_TYPE_CARBON,
-                    AGGREGATE_TYPE_HOUR,
-                    DATA_REFRESH_INTERVAL,
-                    MEASUREMENT_UNIT_KG)
-from homeassistant.helpers.aiohttp_client import async_get_clientsession
+                    MEASUREMENT_UNIT_KG,
+                    POLL_OUTCOME_NEW_DATA,
+                    POLL_OUTCOME_EMPTY,
+                    POLL_OUTCOME_ERROR)
+from .coordinator import PowershaperCoordinator, meters_from_response
+from .meter_cache import async_fetch_meters, async_refresh_meters, meters_cache_expired
+from .api import ApiError, QuotaExceeded, async_get_request_scheduler
+from .reconcile import DigestIndex
 from aiohttp.client_exceptions import ClientError
-from homeassistant.const import UnitOfEnergy
-from homeassistant.components.recorder.models import StatisticData
-from homeassistant.components.recorder.statistics import async_import_statistics
+from homeassistant.const import PERCENTAGE, EntityCategory, UnitOfEnergy, UnitOfInformation, UnitOfTime
+from homeassistant.exceptions import PlatformNotReady
+from homeassistant.helpers.event import async_track_time_interval
+from homeassistant.helpers.update_coordinator import CoordinatorEntity
 from homeassistant.components.sensor import (
     SensorDeviceClass,
     SensorEntity,
     SensorStateClass,
 )
 
-SCAN_INTERVAL = timedelta(seconds=3600)
-
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -44,216 +46,128 @@ async def async_setup_entry(hass, entry, async_add_entities) -> bool:
     entities = []
     api_token = entry.data['api_token']
 
-    # fetch auth data from Powershaper's API
-    response_data = await async_fetch_data(hass, api_token, POWERSHAPER_AUTH_URL)
-
-    consent_uuid = response_data[0]["consent_uuid"]
-    earliest_electricity_date = response_data[0]['range']['earliest'][:10]
-    latest_electricity_date = response_data[0]['range']['latest'][:10]
-    earliest_gas_date = response_data[1]['range']['earliest'][:10]
-    latest_gas_date = response_data[1]['range']['latest'][:10]
-
-    # Create sensor entities
-    gas_meter = GasMeter(entry.data, SENSOR_TYPE_GAS,
-                         consent_uuid, api_token, earliest_gas_date, latest_gas_date)
-    electricity_meter = ElectricityMeter(entry.data, SENSOR_TYPE_ELECTRICITY,
-                                         consent_uuid, api_token, earliest_electricity_date, latest_electricity_date)
-    electricity_co2_meter = ElectricityCo2Emissions(entry.data, SENSOR_TYPE_CARBON,
-                                                    consent_uuid, api_token, earliest_electricity_date, latest_electricity_date)
-    entities.append(gas_meter)
-    entities.append(electricity_meter)
-    entities.append(electricity_co2_meter)
-
-    # Add the sensors to Home Assistant
-    async_add_entities(entities, update_before_add=True)
+    # the meters are cached in the entry, only an entry without them has to wait for the API
+    response_data = entry.data.get(CONF_METERS)
+    if response_data is None:
+        try:
+            response_data = await async_fetch_meters(hass, entry)
+        except (ApiError, QuotaExceeded, ClientError, asyncio.TimeoutError) as ex:
+            raise PlatformNotReady(
+                f"Unable to fetch the meters from the Powershaper API: {ex}") from ex
+    elif meters_cache_expired(entry):
+        hass.async_create_task(async_refresh_meters(hass, entry))
+
+    async def async_refresh_meters_interval(now) -> None:
+        await async_refresh_meters(hass, entry)
+
+    entry.async_on_unload(async_track_time_interval(
+        hass, async_refresh_meters_interval, METERS_CACHE_TTL))
+
+    # every meter on the token gets its sensors, electricity and carbon are both read
+    # from the electricity series, which is fetched once for the two
+    meters = meters_from_response(response_data, api_token)
+    coordinator = PowershaperCoordinator(hass, entry.entry_id, meters)
+
+    # Create sensor entities, the meter of each type first set up keeps the plain statistic ids (sensor.gas, ...),
+    # the sensors of any other meter get ids made from its consent
+    primary_consents = primary_meter_consents(hass, entry, meters)
+    for meter in meters:
+        suffix = "" if primary_consents[meter.meter_type] == meter.consent_uuid else consent_suffix(meters, meter)
+        for sensor_class, sensor_type in METER_SENSORS[meter.meter_type]:
+            entities.append(sensor_class(
+                coordinator, meter, entry.data, sensor_type, suffix))
+
+    # diagnostic sensors of each meter, disabled by default
+    request_metrics = async_get_request_scheduler(hass, api_token).metrics
+    for meter in meters:
+        for key, unit, device_class, value in DIAGNOSTIC_SENSORS:
+            entities.append(PowershaperDiagnosticSensor(
+                coordinator, meter, request_metrics, key, unit, device_class, value))
+
+    # Add the sensors to Home Assistant straight away, they are unavailable until their history is imported
+    async_add_entities(entities)
+
+    # the historic data is imported in the background, the task is cancelled when the entry is unloaded
+    backfill_task = entry.async_create_background_task(
+        hass, coordinator.async_refresh(), f"{DOMAIN} backfill {entry.entry_id}")
 
     # Store the client and sensors in the hass data for later use
     if DOMAIN not in hass.data:
         hass.data[DOMAIN] = {}
 
     hass.data[DOMAIN][entry.entry_id] = {
-        "entry_data":  entry.data, "entities": entities}
+        "entry_data":  entry.data, "entities": entities, "coordinator": coordinator,
+        "backfill_task": backfill_task}
 
     return True
 
 
-async def async_fetch_data(hass, api_token, url) -> dict[str, Any]:
-    """Fetch data from Powershaper's API"""
-
-    session = async_get_clientsession(hass)
-    headers = {
-        'Authorization': f'Token {api_token}',
-        'Content-Type': 'application/json'
-    }
-
-    try:
-        async with session.get(url, headers=headers) as response:
-            response_data = await response.json()
-    except ClientError as ex:
-        _LOGGER.error(
-            f"Client error while fetching data from Powershaper API: {ex} | response status: {response.status}")
-    except Exception as ex:
-        _LOGGER.error(
-            f"Unexpected exception while fetching data from the Powershaper API: {ex} | response status: {response.status}")
-
-    return response_data
-
-
-def url_builder(sensor: SensorEntity, consent_uuid: str, start_date: str, end_date: str, aggregate: str) -> str:
-    """Build a url which is used to fetch the latest data from Powershaper for a given sensor type: gas or electricity."""
-
-    # currently only retrieving the carbon_kg from the electricity meter
-    if sensor.sensor_type is SENSOR_TYPE_CARBON:
-        sensor_type = SENSOR_TYPE_ELECTRICITY
-    else:
-        sensor_type = sensor.sensor_type
-
-    return POWERSHAPER_BASE_SENSOR_URL+consent_uuid+"/"+sensor_type+"?start="+start_date+"&end="+end_date+"&aggregate="+aggregate+"&tz=UTC"
-
-
-async def async_fetch_historic_data(hass, sensor: SensorEntity) -> dict[str, Any]:
-    """Fetches all available historic data for a given sensor"""
-    api_url = url_builder(
-        sensor, sensor.consent_uuid, sensor.earliest_date, sensor.latest_date, AGGREGATE_TYPE_HOUR)
-
-    historic_data = await async_fetch_data(hass, sensor.api_token, api_url)
+def primary_meter_consents(hass, entry, meters) -> dict[str, str]:
+    """Return the consent of the meter of each type that keeps the plain statistic ids, stored in the entry.
 
-    return historic_data
-
-
-async def async_poll_new_data(hass, sensor: SensorEntity) -> list[Any]:
-    """Calls the Powershaper API to check if there is new data available. 
-
-    Returns a list of data or an empty list if no new data is available.
+    It is the first meter of the type the entry was set up with, so meters of other consents listed later
+    never take over its statistics.
     """
-    today = str(date.today())
-    latest_date = sensor.latest_date
-
-    api_url = url_builder(sensor, sensor.consent_uuid,
-                          latest_date, today, AGGREGATE_TYPE_HOUR)
-
-    response_data = await async_fetch_data(hass, sensor.api_token, api_url)
-
-    response_latest_timestamp = datetime.strptime(
-        response_data[-1]['time'], '%Y-%m-%dT%H:%M:%SZ').replace(tzinfo=pytz.UTC)
-
-    sensor_latest_timestamp = datetime.strptime(
-        sensor.latest_timestamp, '%Y-%m-%dT%H:%M:%SZ').replace(tzinfo=pytz.UTC)
-
-    new_data = []
-
-    # Since we cannot predict which hour the last timestamp was made available
-    # this ensures that only data after the last imported timestamp is added
-    if (response_latest_timestamp > sensor_latest_timestamp):
-        for data in response_data:
-
-            temp_timestamp = datetime.strptime(
-                data['time'], '%Y-%m-%dT%H:%M:%SZ').replace(tzinfo=pytz.UTC)
-
-            if (temp_timestamp > sensor_latest_timestamp):
-                new_data.append(data)
+    primary_consents = dict(entry.data.get(CONF_PRIMARY_CONSENTS, {}))
+    for meter in meters:
+        primary_consents.setdefault(meter.meter_type, meter.consent_uuid)
 
-        return new_data
+    if primary_consents != entry.data.get(CONF_PRIMARY_CONSENTS):
+        hass.config_entries.async_update_entry(
+            entry, data={**entry.data, CONF_PRIMARY_CONSENTS: primary_consents})
+    return primary_consents
 
-    return []
 
+def consent_suffix(meters, meter) -> str:
+    """Return the suffix of the statistic ids of a meter that is not the primary one of its type.
 
-async def async_import_data(hass, sensor: SensorEntity, data, current_sum) -> NamedTuple:
-    """Imports data into Home Assistant's database using the Statistics API."""
-    if sensor.sensor_type is SENSOR_TYPE_CARBON:
-        key_type = 'carbon_kg'
-    else:
-        key_type = 'energy_kwh'
-
-    statistics = []
-    metadata = {
-        "has_mean": False,
-        "has_sum": True,
-        "name": None,
-        "source": "recorder",
-        "statistic_id": "sensor." + sensor.sensor_type,
-        "unit_of_measurement": sensor.unit_of_measurement
-    }
-
-    for data_point in data:
-        current_sum += data_point[key_type]
-        statistics.append(
-            StatisticData(
-                start=datetime.strptime(
-                    data_point['time'], '%Y-%m-%dT%H:%M:%SZ').replace(tzinfo=pytz.UTC),
-                state=data_point[key_type],
-                sum=current_sum,
-                last_reset=None
-            )
-        )
-        latest_timestamp = data_point['time']
-
-    async_import_statistics(hass, metadata, statistics)
-
-    ReturnData = namedtuple('ReturnData', ['sum', 'latest_timestamp'])
-    return ReturnData(current_sum, latest_timestamp)
-
-
-def historic_refresh(last_refresh_date) -> bool:
-    """A check whether it is time to do a historic data refresh"""
-    if (datetime.now() - last_refresh_date >= timedelta(days=DATA_REFRESH_INTERVAL)):
-        return True
-    return False
+    It is made from the start of its consent uuid, or the whole of it should another consent start the same way.
+    """
+    prefixes = Counter(consent_uuid[:8].lower() for consent_uuid in {other.consent_uuid for other in meters})
+    prefix = meter.consent_uuid[:8].lower()
+    if prefixes[prefix] > 1:
+        return "_" + meter.consent_uuid.lower().replace("-", "_")
+    return "_" + prefix
 
 
-class GasMeter(SensorEntity):
-    """Representation of a gas sensor."""
+class PowershaperSensor(CoordinatorEntity, SensorEntity):
+    """Base representation of a sensor fed from a Powershaper meter series."""
 
     _attr_device_class = SensorDeviceClass.ENERGY
-    _attr_unit_of_measurement = UnitOfEnergy.KILO_WATT_HOUR
     _attr_state_class = SensorStateClass.TOTAL_INCREASING
-
-    def __init__(self, entry_data, sensor_type, consent_uuid, api_token, earliest_date, latest_date):
-        """Initialize a gas sensor."""
-        self._attr_unique_id = DOMAIN+sensor_type+earliest_date
+    _attr_icon = None
+
+    # field of a data point that is imported as this sensor's statistic
+    data_key = 'energy_kwh'
+    # additional fields of a data point the sensor reads, fetched in the same request
+    extra_fields = ()
+
+    def __init__(self, coordinator, meter, entry_data, sensor_type, suffix=""):
+        """Initialize a sensor and register it with its meter.
+
+        Sensors of further meters of the same type get a suffix made from their consent uuid.
+        """
+        super().__init__(coordinator)
+        self._attr_unique_id = DOMAIN+sensor_type+meter.earliest_date
+        if suffix:
+            self._attr_unique_id += meter.consent_uuid
         self.entry_data = entry_data
         self.sensor_type = sensor_type
-        self.consent_uuid = consent_uuid
-        self.api_token = api_token
+        self.suffix = suffix
+        # the statistics are imported under the entity id of the sensor
+        self.statistic_id = "sensor." + sensor_type + suffix
+        self.entity_id = self.statistic_id
+        self.meter = meter
         self.sum = 0
         self.initialized = False
-        self.earliest_date = earliest_date
-        self.latest_date = latest_date
         self.latest_timestamp = None
-        self.last_refresh_date = datetime.now()
-
-    async def async_update(self):
-        """Fetches historic data upon initialization, with subsequent polls every hour for new data from the Powershaper API."""
-        try:
-            if not self.initialized or historic_refresh(self.last_refresh_date):
-                historic_data = await async_fetch_historic_data(self.hass, self)
-                response = await async_import_data(self.hass, self, historic_data, 0)
-                self.sum = response.sum
-                self.latest_timestamp = response.latest_timestamp
-                self.latest_date = response.latest_timestamp[:10]
-                self.last_data_refesh = datetime.now()
-                self.initialized = True
-                _LOGGER.debug(
-                    f"Successfully imported historic {self.sensor_type} data")
-            else:
-                new_data = await async_poll_new_data(self.hass, self)
-                if new_data:
-                    _LOGGER.debug(
-                        f"New data is available for {self.sensor_type} sensor")
-                    response = await async_import_data(self.hass, self, new_data, self.sum)
-                    self.sum = response.sum
-                    self.latest_timestamp = response.latest_timestamp
-                    self.latest_date = response.latest_timestamp[:10]
-                else:
-                    _LOGGER.debug(
-                        f"No new data available for {self.sensor_type}")
-        except Exception as error:
-            _LOGGER.error("Error updating sensor: %s", error)
+        self.digests = DigestIndex()
+        meter.sensors.append(self)
 
     @property
     def name(self):
         """Return the name of the sensor."""
-        return f"{self.sensor_type}"
+        return f"{self.sensor_type}{self.suffix.replace('_', ' ')}"
 
     @property
     def unit_of_measurement(self):
@@ -263,7 +177,20 @@ class GasMeter(SensorEntity):
     @property
     def icon(self):
         """Return the icon of the sensor."""
-        return ICON_GAS_METER
+        return self._attr_icon
+
+    @property
+    def available(self) -> bool:
+        """Return whether the history of the sensor has been imported and the last update of its meter succeeded."""
+        return super().available and self.meter.available and self.initialized
+
+    @property
+    def extra_state_attributes(self):
+        """Return the hours missing from the sensor's meter and the progress (%) of a running backfill."""
+        attributes = {"gaps": self.meter.gaps.gap_count}
+        if self.meter.backfill_progress is not None:
+            attributes["backfill_progress"] = self.meter.backfill_progress
+        return attributes
 
     @property
     def device_class(self):
@@ -271,140 +198,85 @@ class GasMeter(SensorEntity):
         return self._attr_device_class
 
 
-class ElectricityMeter(SensorEntity):
-    """Representation of an electricity sensor."""
+class GasMeter(PowershaperSensor):
+    """Representation of a gas sensor."""
 
-    _attr_device_class = SensorDeviceClass.ENERGY
     _attr_unit_of_measurement = UnitOfEnergy.KILO_WATT_HOUR
-    _attr_state_class = SensorStateClass.TOTAL_INCREASING
+    _attr_icon = ICON_GAS_METER
 
-    def __init__(self, entry_data, sensor_type, consent_uuid, api_token, earliest_date, latest_date):
-        """Initialize a Electricity sensor."""
-        self._attr_unique_id = DOMAIN+sensor_type+earliest_date
-        self.entry_data = entry_data
-        self.sensor_type = sensor_type
-        self.consent_uuid = consent_uuid
-        self.api_token = api_token
-        self.sum = 0
-        self.initialized = False
-        self.earliest_date = earliest_date
-        self.latest_date = latest_date
-        self.latest_timestamp = None
-        self.last_refresh_date = datetime.now()
-
-    async def async_update(self):
-        """Fetches historic data upon initialization, with subsequent polls every hour for new data from the Powershaper API."""
-        try:
-            if not self.initialized or historic_refresh(self.last_refresh_date):
-                historic_data = await async_fetch_historic_data(self.hass, self)
-                response = await async_import_data(self.hass, self, historic_data, 0)
-                self.sum = response.sum
-                self.latest_timestamp = response.latest_timestamp
-                self.latest_date = response.latest_timestamp[:10]
-                _LOGGER.debug(
-                    f"Successfully imported historic {self.sensor_type} data")
-                self.initialized = True
-            else:
-                new_data = await async_poll_new_data(self.hass, self)
-                if new_data:
-                    _LOGGER.debug(
-                        f"New data is available for {self.sensor_type} sensor")
-                    response = await async_import_data(self.hass, self, new_data, self.sum)
-                    self.sum = response.sum
-                    self.latest_timestamp = response.latest_timestamp
-                    self.latest_date = response.latest_timestamp[:10]
-                else:
-                    _LOGGER.debug(
-                        f"No new data available for {self.sensor_type}")
-        except Exception as error:
-            _LOGGER.error("Error updating sensor: %s", error)
-
-    @property
-    def name(self):
-        """Return the name of the sensor."""
-        return f"{self.sensor_type}"
 
-    @property
-    def unit_of_measurement(self):
-        """Return the unit of measurement."""
-        return self._attr_unit_of_measurement
-
-    @property
-    def icon(self):
-        """Return the icon of the sensor."""
-        return ICON_ELECTRICITY_METER
+class ElectricityMeter(PowershaperSensor):
+    """Representation of an electricity sensor."""
 
-    @property
-    def device_class(self):
-        """Return the device class of the sensor."""
-        return self._attr_device_class
+    _attr_unit_of_measurement = UnitOfEnergy.KILO_WATT_HOUR
+    _attr_icon = ICON_ELECTRICITY_METER
 
 
-class ElectricityCo2Emissions(SensorEntity):
+class ElectricityCo2Emissions(PowershaperSensor):
     """Representation of an electricity carbon sensor."""
 
-    _attr_device_class = SensorDeviceClass.ENERGY
     _attr_unit_of_measurement = MEASUREMENT_UNIT_KG
-    _attr_state_class = SensorStateClass.TOTAL_INCREASING
+    _attr_icon = ICON_MOLECULE_CO2
 
-    def __init__(self, entry_data, sensor_type, consent_uuid, api_token, earliest_date, latest_date):
-        """Initialize a ElectricityCo2Emissions sensor."""
-        self._attr_unique_id = DOMAIN+sensor_type+earliest_date
-        self.entry_data = entry_data
-        self.sensor_type = sensor_type
-        self.consent_uuid = consent_uuid
-        self.api_token = api_token
-        self.sum = 0
-        self.initialized = False
-        self.earliest_date = earliest_date
-        self.latest_date = latest_date
-        self.latest_timestamp = None
-        self.last_refresh_date = datetime.now()
+    data_key = 'carbon_kg'
 
-    async def async_update(self):
-        """Fetches historic data upon initialization, with subsequent polls every hour for new data from the Powershaper API."""
-        try:
-            if not self.initialized or historic_refresh(self.last_refresh_date):
-                # fetch historic data upon initialization
-                historic_data = await async_fetch_historic_data(self.hass, self)
-                response = await async_import_data(self.hass, self, historic_data, 0)
-                self.sum = response.sum
-                self.latest_timestamp = response.latest_timestamp
-                self.latest_date = response.latest_timestamp[:10]
-                _LOGGER.debug(
-                    f"Successfully imported historic {self.sensor_type} data")
-                self.initialized = True
-            else:
-                new_data = await async_poll_new_data(self.hass, self)
-                if new_data:
-                    _LOGGER.debug(
-                        f"New data is available for {self.sensor_type} sensor")
-                    response = await async_import_data(self.hass, self, new_data, self.sum)
-                    self.sum = response.sum
-                    self.latest_timestamp = response.latest_timestamp
-                    self.latest_date = response.latest_timestamp[:10]
-                else:
-                    _LOGGER.debug(
-                        f"No new data available for {self.sensor_type}")
-        except Exception as error:
-            _LOGGER.error("Error updating sensor: %s", error)
 
-    @property
-    def name(self):
-        """Return the name of the sensor."""
-        return f"{self.sensor_type}"
+# the sensors created for each type of meter, with their sensor type
+METER_SENSORS = {
+    SENSOR_TYPE_GAS: [(GasMeter, SENSOR_TYPE_GAS)],
+    SENSOR_TYPE_ELECTRICITY: [(ElectricityMeter, SENSOR_TYPE_ELECTRICITY),
+                              (ElectricityCo2Emissions, SENSOR_TYPE_CARBON)],
+}
 
-    @property
-    def unit_of_measurement(self):
-        """Return the unit of measurement."""
-        return self._attr_unit_of_measurement
 
-    @property
-    def icon(self):
-        """Return the icon of the sensor."""
-        return ICON_MOLECULE_CO2
+class PowershaperDiagnosticSensor(CoordinatorEntity, SensorEntity):
+    """A diagnostic sensor showing what updating a meter costs, disabled by default."""
+
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+    _attr_entity_registry_enabled_default = False
+
+    def __init__(self, coordinator, meter, request_metrics, key, unit, device_class, value):
+        """Initialize a diagnostic sensor reading its value from a meter and the request metrics of its API token."""
+        super().__init__(coordinator)
+        self._attr_unique_id = f"{DOMAIN}_{meter.key}_{key}"
+        self._attr_native_unit_of_measurement = unit
+        self._attr_device_class = device_class
+        if device_class == SensorDeviceClass.ENUM:
+            self._attr_options = [POLL_OUTCOME_NEW_DATA, POLL_OUTCOME_EMPTY, POLL_OUTCOME_ERROR]
+        suffix = meter.sensors[0].suffix if meter.sensors else ""
+        self._attr_name = f"{meter.meter_type}{suffix.replace('_', ' ')} {key.replace('_', ' ')}"
+        self.meter = meter
+        self.request_metrics = request_metrics
+        self._value = value
 
     @property
-    def device_class(self):
-        """Return the device class of the sensor."""
-        return self._attr_device_class
+    def native_value(self):
+        """Return the current value of the metric."""
+        return self._value(self.meter, self.request_metrics)
+
+
+def _milliseconds(seconds):
+    """Return a duration in seconds as rounded milliseconds, None if unknown."""
+    return None if seconds is None else round(seconds * 1000)
+
+
+# the diagnostic sensors created for each meter: key, unit, device class and how the value is read
+# from the meter and the request metrics of its API token (requests are shared by every meter of the token)
+DIAGNOSTIC_SENSORS = [
+    ("request_latency", UnitOfTime.MILLISECONDS, SensorDeviceClass.DURATION,
+     lambda meter, requests: _milliseconds(requests.last_latency)),
+    ("response_bytes", UnitOfInformation.BYTES, SensorDeviceClass.DATA_SIZE,
+     lambda meter, requests: requests.last_bytes),
+    ("api_calls_per_hour", None, None,
+     lambda meter, requests: requests.calls_per_hour),
+    ("points_parsed", None, None,
+     lambda meter, requests: meter.metrics.points_parsed),
+    ("parse_time", UnitOfTime.SECONDS, SensorDeviceClass.DURATION,
+     lambda meter, requests: round(meter.metrics.parse_time, 3)),
+    ("import_time", UnitOfTime.SECONDS, SensorDeviceClass.DURATION,
+     lambda meter, requests: round(meter.metrics.import_time, 3)),
+    ("last_poll", None, SensorDeviceClass.ENUM,
+     lambda meter, requests: meter.metrics.last_poll),
+    ("backfill_progress", PERCENTAGE, None,
+     lambda meter, requests: meter.backfill_progress),
+]
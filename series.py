@@ -0,0 +1,258 @@
+"""
+series.py - compact array backed representation of an hourly Powershaper meter series
+
+Authored by Robert Sahakyan
+"""
+
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta, timezone
+import json
+from typing import Any, Iterable, Iterator
+from homeassistant.components.recorder.models import StatisticData
+from .timestamps import parse_epoch, format_timestamp
+from .streaming import JsonArrayDecoder
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def hour_to_datetime(hour: int) -> datetime:
+    """Return the aware UTC datetime of an epoch hour."""
+    return _EPOCH + timedelta(hours=hour)
+
+
+def day_to_datetime(day: int) -> datetime:
+    """Return the aware UTC datetime of the start of an epoch day."""
+    return _EPOCH + timedelta(days=day)
+
+
+def timestamp_to_hour(timestamp: str) -> int:
+    """Return the epoch hour of a Powershaper timestamp."""
+    return parse_epoch(timestamp) // 3600
+
+
+def points_after(data: list[dict[str, Any]], timestamp: str) -> list[dict[str, Any]]:
+    """Return the data points of a chronological API response that are newer than a Powershaper timestamp.
+
+    The timestamps share one fixed width format, so they compare as strings and the first newer point is
+    found by binary search, without parsing the points before it.
+    """
+    if timestamp is None:
+        return data
+    start = bisect_right(data, timestamp, key=lambda point: point['time'])
+    return data if start == 0 else data[start:]
+
+
+class MeterSeries:
+    """An hourly series held in typed arrays: epoch hours, one value column per field and its cumulative sum.
+
+    The cumulative sums start from 0 at the first hour of the series, the running sum of a sensor is added on import.
+    """
+
+    def __init__(self, fields: Iterable[str]):
+        """Initialize an empty series for the given data fields."""
+        self.fields = tuple(fields)
+        self.hours = array('q')
+        self.values = {field: array('d') for field in self.fields}
+        self.cumulative = {field: array('d') for field in self.fields}
+
+    @classmethod
+    def from_points(cls, data: Iterable[dict[str, Any]], fields: Iterable[str]) -> "MeterSeries":
+        """Build a series from the data points of an API response."""
+        series = cls(fields)
+        series.extend(data)
+        return series
+
+    def __len__(self) -> int:
+        """Return the number of hours in the series."""
+        return len(self.hours)
+
+    @property
+    def first_hour(self):
+        """Return the first epoch hour of the series, or None when it is empty."""
+        return self.hours[0] if self.hours else None
+
+    @property
+    def last_hour(self):
+        """Return the last epoch hour of the series, or None when it is empty."""
+        return self.hours[-1] if self.hours else None
+
+    @property
+    def last_timestamp(self):
+        """Return the Powershaper timestamp of the last hour of the series, or None when it is empty."""
+        return format_timestamp(hour_to_datetime(self.hours[-1])) if self.hours else None
+
+    def total(self, field: str) -> float:
+        """Return the sum of a field over the whole series."""
+        cumulative = self.cumulative[field]
+        return cumulative[-1] if cumulative else 0.0
+
+    def append(self, hour: int, point: dict[str, Any]) -> None:
+        """Append the values of a data point at a given epoch hour."""
+        self.hours.append(hour)
+        for field in self.fields:
+            value = point[field]
+            cumulative = self.cumulative[field]
+            self.values[field].append(value)
+            cumulative.append(cumulative[-1] + value if cumulative else value)
+
+    def extend(self, data: Iterable[dict[str, Any]]) -> None:
+        """Append data points, skipping any that are not newer than the last hour of the series."""
+        for point in data:
+            hour = parse_epoch(point['time']) // 3600
+            if self.hours and hour <= self.hours[-1]:
+                continue
+            self.append(hour, point)
+
+    def extend_series(self, other: "MeterSeries") -> None:
+        """Append the hours of another series with the same fields that are newer than the last hour of this one."""
+        start = 0 if not self.hours else bisect_right(other.hours, self.hours[-1])
+        if start >= len(other.hours):
+            return
+
+        self.hours.extend(other.hours[start:])
+        for field in self.fields:
+            values = other.values[field][start:]
+            cumulative = self.cumulative[field]
+            total = cumulative[-1] if cumulative else 0.0
+            self.values[field].extend(values)
+            for value in values:
+                total += value
+                cumulative.append(total)
+
+    def to_bytes(self) -> bytes:
+        """Return the series packed as a JSON header of its fields and length followed by its arrays."""
+        header = json.dumps({"fields": self.fields, "length": len(self)}).encode()
+        parts = [len(header).to_bytes(4, "little"), header, self.hours.tobytes()]
+        parts.extend(self.values[field].tobytes() for field in self.fields)
+        return b"".join(parts)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "MeterSeries":
+        """Unpack a series packed by to_bytes, recomputing its cumulative sums."""
+        header_size = int.from_bytes(data[:4], "little")
+        header = json.loads(data[4:4 + header_size])
+        series = cls(header["fields"])
+        position = 4 + header_size
+        size = header["length"] * 8
+
+        series.hours.frombytes(data[position:position + size])
+        for field in series.fields:
+            position += size
+            series.values[field].frombytes(data[position:position + size])
+            cumulative = series.cumulative[field]
+            total = 0.0
+            for value in series.values[field]:
+                total += value
+                cumulative.append(total)
+        return series
+
+    def replace_hours(self, other: "MeterSeries") -> None:
+        """Replace the hours from the first to the last hour of another series with its hours, e.g. a revised day.
+
+        The cumulative sums are recomputed from the first replaced hour on.
+        """
+        if not len(other):
+            return
+        start = bisect_left(self.hours, other.hours[0])
+        stop = bisect_right(self.hours, other.hours[-1])
+
+        self.hours[start:stop] = other.hours
+        for field in self.fields:
+            values = self.values[field]
+            values[start:stop] = other.values[field]
+            cumulative = self.cumulative[field]
+            del cumulative[start:]
+            total = cumulative[-1] if cumulative else 0.0
+            for value in values[start:]:
+                total += value
+                cumulative.append(total)
+
+    def total_between(self, field: str, first_hour: int, last_hour: int) -> float:
+        """Return the sum of a field over the epoch hours from first_hour to last_hour (inclusive), by binary search."""
+        cumulative = self.cumulative[field]
+        start = bisect_left(self.hours, first_hour)
+        stop = bisect_right(self.hours, last_hour)
+        if stop <= start:
+            return 0.0
+        return cumulative[stop - 1] - (cumulative[start - 1] if start else 0.0)
+
+    def slice(self, start: int, stop: int = None) -> "MeterSeries":
+        """Return the hours between two indices as a new series, with its cumulative sums starting from 0."""
+        series = MeterSeries(self.fields)
+        series.hours = self.hours[start:stop]
+        for field in self.fields:
+            values = self.values[field][start:stop]
+            series.values[field] = values
+            cumulative = series.cumulative[field]
+            total = 0.0
+            for value in values:
+                total += value
+                cumulative.append(total)
+        return series
+
+    def after(self, hour) -> "MeterSeries":
+        """Return the hours of the series newer than a given epoch hour (all of them for None)."""
+        if hour is None:
+            return self
+        start = bisect_right(self.hours, hour)
+        return self if start == 0 else self.slice(start)
+
+    def until(self, hour) -> "MeterSeries":
+        """Return the hours of the series up to and including a given epoch hour."""
+        stop = bisect_right(self.hours, hour)
+        return self if stop == len(self.hours) else self.slice(0, stop)
+
+    def day_ranges(self) -> Iterator[tuple[int, int, int]]:
+        """Yield the epoch day of each day in the series with the start and stop index of its hours."""
+        hours = self.hours
+        start = 0
+        while start < len(hours):
+            day = hours[start] // 24
+            stop = bisect_right(hours, day * 24 + 23, start)
+            yield day, start, stop
+            start = stop
+
+    def statistics(self, field: str, base_sum: float, start: int = 0, stop: int = None) -> list[StatisticData]:
+        """Return the statistics of a field between two indices, with the sums carried on from base_sum."""
+        cumulative = self.cumulative[field]
+        offset = cumulative[start - 1] if start > 0 else 0.0
+        base_sum -= offset
+
+        return [
+            StatisticData(
+                start=hour_to_datetime(hour),
+                state=value,
+                sum=base_sum + total,
+                last_reset=None
+            )
+            for hour, value, total in zip(self.hours[start:stop], self.values[field][start:stop], cumulative[start:stop])
+        ]
+
+
+class SeriesDecoder:
+    """Decode a streamed series response straight into MeterSeries batches.
+
+    Holds the state of one response, its feed is meant to be run in an executor job at a time.
+    """
+
+    def __init__(self, fields: Iterable[str]):
+        """Initialize the decoder for the given data fields."""
+        self.fields = tuple(fields)
+        self._decoder = JsonArrayDecoder()
+
+    def feed(self, data: bytes) -> MeterSeries:
+        """Decode the next bytes of the response into a series of the data points they complete."""
+        return MeterSeries.from_points(self._decoder.feed(data), self.fields)
+
+    def close(self) -> None:
+        """Check the whole response was decoded."""
+        self._decoder.close()
+
+
+def decode_series(data: bytes, fields: tuple[str, ...]) -> MeterSeries:
+    """Decode a whole series response, a picklable job for a process pool."""
+    decoder = SeriesDecoder(fields)
+    series = decoder.feed(data)
+    decoder.close()
+    return series
@@ -0,0 +1,163 @@
+"""
+services.py - the services of the Powershaper integration
+
+Authored by Robert Sahakyan
+"""
+
+import asyncio
+import logging
+import os
+from typing import Any
+import voluptuous as vol
+from homeassistant.core import HomeAssistant, ServiceCall, ServiceResponse, SupportsResponse
+from homeassistant.exceptions import ServiceValidationError
+import homeassistant.helpers.config_validation as cv
+from homeassistant.util import dt as dt_util
+from .const import DOMAIN, SENSOR_TYPE_GAS, SENSOR_TYPE_ELECTRICITY
+from .export import export_path
+from .series import hour_to_datetime
+from .usage import PERIOD_DAY, PERIOD_MONTH
+
+_LOGGER = logging.getLogger(__name__)
+
+SERVICE_IMPORT_FILE = "import_file"
+SERVICE_QUERY_USAGE = "query_usage"
+SERVICE_EXPORT_SERIES = "export_series"
+
+IMPORT_FILE_SCHEMA = vol.Schema({
+    vol.Required("path"): cv.string,
+    vol.Optional("meter_type"): vol.In([SENSOR_TYPE_GAS, SENSOR_TYPE_ELECTRICITY]),
+    vol.Optional("consent_uuid"): cv.string,
+})
+
+QUERY_USAGE_SCHEMA = vol.Schema({
+    vol.Required("start"): cv.datetime,
+    vol.Required("end"): cv.datetime,
+    vol.Optional("meter_type"): vol.In([SENSOR_TYPE_GAS, SENSOR_TYPE_ELECTRICITY]),
+    vol.Optional("consent_uuid"): cv.string,
+    vol.Optional("period"): vol.In([PERIOD_DAY, PERIOD_MONTH]),
+})
+
+EXPORT_SERIES_SCHEMA = vol.Schema({
+    vol.Required("directory"): cv.string,
+    vol.Optional("meter_type"): vol.In([SENSOR_TYPE_GAS, SENSOR_TYPE_ELECTRICITY]),
+    vol.Optional("consent_uuid"): cv.string,
+    vol.Optional("follow", default=True): cv.boolean,
+})
+
+
+def find_meters(hass: HomeAssistant, meter_type: str = None, consent_uuid: str = None) -> list[tuple]:
+    """Return the entry id, coordinator and meter of every meter of the loaded entries matching a type and consent."""
+    matches = []
+    for entry_id, entry_data in hass.data.get(DOMAIN, {}).items():
+        coordinator = entry_data.get("coordinator")
+        if coordinator is None:
+            continue
+        for meter in coordinator.meters:
+            if ((meter_type is None or meter.meter_type == meter_type)
+                    and (consent_uuid is None or meter.consent_uuid == consent_uuid)):
+                matches.append((entry_id, coordinator, meter))
+
+    return matches
+
+
+def find_meter(hass: HomeAssistant, meter_type: str = None, consent_uuid: str = None) -> tuple:
+    """Return the entry id, coordinator and meter matching a type and consent.
+
+    Raises ServiceValidationError unless exactly one meter matches.
+    """
+    matches = find_meters(hass, meter_type, consent_uuid)
+    if len(matches) != 1:
+        raise ServiceValidationError(
+            f"{len(matches)} meters match, pick a single one with meter_type and consent_uuid")
+
+    return matches[0]
+
+
+async def async_import_file(hass: HomeAssistant, entry_id: str, coordinator, meter, path: str) -> int:
+    """Import an export file into a meter, returning the number of hours imported.
+
+    A backfill still running for the entry is stopped first, the next update resumes it after the imported hours.
+    Any other update of the meter that is running (e.g. catching up after a downtime) holds its lock, the import
+    starts once it is done.
+    """
+    if not hass.config.is_allowed_path(path):
+        raise ServiceValidationError(f"Access to {path} is not allowed, add it to allowlist_external_dirs")
+    if not await hass.async_add_executor_job(os.path.isfile, path):
+        raise ServiceValidationError(f"No file at {path}")
+
+    backfill_task = hass.data[DOMAIN][entry_id].get("backfill_task")
+    if backfill_task is not None and not backfill_task.done():
+        backfill_task.cancel()
+        # the backfill releases the lock of the meter once it is cancelled
+        await asyncio.wait([backfill_task])
+
+    if meter.lock.locked():
+        _LOGGER.info(f"The {meter.meter_type} meter is being updated, {path} is imported once the update is done")
+    return await coordinator.async_import_file(meter, path)
+
+
+def usage_of_meter(meter, start, end, period: str = None) -> dict[str, Any]:
+    """Return the usage of every sensor of a meter between two aware datetimes, with its daily or monthly rollup."""
+    fields = {sensor.sensor_type: sensor.data_key for sensor in meter.sensors}
+    series = meter.usage.series
+
+    usage = {
+        "meter_type": meter.meter_type,
+        "consent_uuid": meter.consent_uuid,
+        # the hours the index holds, usage outside them is not known
+        "indexed_from": hour_to_datetime(series.first_hour).isoformat() if len(series) else None,
+        "indexed_until": hour_to_datetime(series.last_hour).isoformat() if len(series) else None,
+        "totals": {sensor_type: meter.usage.total(field, start, end) for sensor_type, field in fields.items()},
+    }
+
+    if period is not None:
+        rollup = meter.usage.rollup(fields.values(), start, end, period, dt_util.DEFAULT_TIME_ZONE)
+        usage["periods"] = [
+            {"start": period_start.isoformat(),
+             **{sensor_type: totals[field] for sensor_type, field in fields.items()}}
+            for period_start, totals in rollup]
+
+    return usage
+
+
+def async_setup_services(hass: HomeAssistant) -> None:
+    """Register the services of the integration."""
+
+    async def async_handle_import_file(call: ServiceCall) -> ServiceResponse:
+        """Handle a call of the import_file service."""
+        entry_id, coordinator, meter = find_meter(
+            hass, call.data.get("meter_type"), call.data.get("consent_uuid"))
+        imported = await async_import_file(hass, entry_id, coordinator, meter, call.data["path"])
+        return {"hours_imported": imported, "latest_timestamp": meter.latest_timestamp}
+
+    async def async_handle_query_usage(call: ServiceCall) -> ServiceResponse:
+        """Handle a call of the query_usage service."""
+        start, end = dt_util.as_utc(call.data["start"]), dt_util.as_utc(call.data["end"])
+        if end <= start:
+            raise ServiceValidationError("The end of the range must be after its start")
+
+        return {"meters": [
+            usage_of_meter(meter, start, end, call.data.get("period"))
+            for _, _, meter in find_meters(hass, call.data.get("meter_type"), call.data.get("consent_uuid"))]}
+
+    async def async_handle_export_series(call: ServiceCall) -> ServiceResponse:
+        """Handle a call of the export_series service."""
+        directory = call.data["directory"]
+        if not hass.config.is_allowed_path(directory):
+            raise ServiceValidationError(f"Access to {directory} is not allowed, add it to allowlist_external_dirs")
+
+        exports = []
+        for _, coordinator, meter in find_meters(hass, call.data.get("meter_type"), call.data.get("consent_uuid")):
+            path = export_path(directory, meter.key)
+            hours = await coordinator.async_export_meter(meter, path, call.data["follow"])
+            exports.append({"meter_type": meter.meter_type, "consent_uuid": meter.consent_uuid,
+                            "path": path, "hours": hours})
+        return {"exports": exports}
+
+    hass.services.async_register(DOMAIN, SERVICE_IMPORT_FILE, async_handle_import_file,
+                                 schema=IMPORT_FILE_SCHEMA, supports_response=SupportsResponse.OPTIONAL)
+    hass.services.async_register(DOMAIN, SERVICE_QUERY_USAGE, async_handle_query_usage,
+                                 schema=QUERY_USAGE_SCHEMA, supports_response=SupportsResponse.ONLY)
+    hass.services.async_register(DOMAIN, SERVICE_EXPORT_SERIES, async_handle_export_series,
+                                 schema=EXPORT_SERIES_SCHEMA, supports_response=SupportsResponse.OPTIONAL)
@@ -0,0 +1,111 @@
+"""
+streaming.py - incremental decoding of the JSON arrays returned by the Powershaper API
+
+Authored by Robert Sahakyan
+"""
+
+import codecs
+import json
+from typing import Any, AsyncIterator, Awaitable, Callable
+
+STREAM_CHUNK_SIZE = 64 * 1024
+
+_WHITESPACE = " \t\n\r"
+
+
+class JsonArrayDecoder:
+    """Decode the items of a top level JSON array from chunks of bytes as they arrive.
+
+    Only complete items are returned, the undecoded tail of the array is kept until the next chunk.
+    Items are expected to be objects, as is the case for every Powershaper series.
+    """
+
+    def __init__(self):
+        """Initialize the decoder."""
+        self._decoder = json.JSONDecoder()
+        self._utf8 = codecs.getincrementaldecoder('utf-8')()
+        self._buffer = ""
+        self._started = False
+        self._finished = False
+        self._decoded_any = False
+        self._expect_separator = False
+
+    def feed(self, chunk: bytes) -> list[Any]:
+        """Decode a chunk of the response, returning the items it completed."""
+        buffer = self._buffer + self._utf8.decode(chunk)
+        length = len(buffer)
+        items = []
+        position = 0
+
+        while True:
+            while position < length and buffer[position] in _WHITESPACE:
+                position += 1
+            if position >= length:
+                break
+
+            character = buffer[position]
+
+            if self._finished:
+                raise ValueError("Unexpected data after the end of the JSON array")
+
+            if not self._started:
+                if character != '[':
+                    raise ValueError("Expected a JSON array")
+                self._started = True
+                position += 1
+                continue
+
+            if self._expect_separator:
+                if character == ',':
+                    self._expect_separator = False
+                elif character == ']':
+                    self._finished = True
+                else:
+                    raise ValueError("Expected ',' or ']' in the JSON array")
+                position += 1
+                continue
+
+            if character == ']' and not self._decoded_any:
+                # empty array
+                self._finished = True
+                position += 1
+                continue
+
+            try:
+                item, position = self._decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                # the item is not complete yet, wait for the next chunk
+                break
+            items.append(item)
+            self._decoded_any = True
+            self._expect_separator = True
+
+        self._buffer = buffer[position:]
+        return items
+
+    def close(self) -> None:
+        """Check the whole array was received."""
+        self._buffer += self._utf8.decode(b"", final=True)
+        if not self._finished or self._buffer.strip(_WHITESPACE):
+            raise ValueError("Truncated JSON array")
+
+
+async def async_iter_decoded(response, feed: Callable[[bytes], Any], batch_bytes: int,
+                             run_job: Callable[..., Awaitable[Any]]) -> AsyncIterator[Any]:
+    """Read a response in chunks and yield what feed decodes from every batch_bytes of it.
+
+    feed is called through run_job, e.g. hass.async_add_executor_job, so the decoding happens off the event loop.
+    """
+    chunks = []
+    size = 0
+
+    async for chunk in response.content.iter_chunked(STREAM_CHUNK_SIZE):
+        chunks.append(chunk)
+        size += len(chunk)
+        if size >= batch_bytes:
+            yield await run_job(feed, b"".join(chunks))
+            chunks = []
+            size = 0
+
+    if chunks:
+        yield await run_job(feed, b"".join(chunks))
@@ -0,0 +1,43 @@
+"""
+Tests for the requests shared per API token.
+
+Authored by Robert Sahakyan
+"""
+import asyncio
+from homeassistant.core import HomeAssistant
+import pytest
+from .. import api
+
+
+@pytest.mark.asyncio
+async def test_concurrent_identical_streams_share_one_download(hass: HomeAssistant):
+    """Test consumers of the same stream in flight share one download and all get every item."""
+    downloads = 0
+    release = asyncio.Event()
+
+    async def download():
+        nonlocal downloads
+        downloads += 1
+        await release.wait()
+        yield 1
+        yield 2
+
+    scheduler = api.RequestScheduler(hass, "0" * 40)
+    scheduler.async_stream = lambda url, iter_response: download()
+
+    async def consume():
+        return [item async for item in scheduler.async_shared_stream("key", "url", None)]
+
+    consumers = [asyncio.create_task(consume()) for _ in range(3)]
+    await asyncio.sleep(0)
+    release.set()
+
+    assert await asyncio.gather(*consumers) == [[1, 2]] * 3
+    assert downloads == 1
+    assert scheduler.metrics.coalesced == 2
+
+    await hass.async_block_till_done()
+    assert scheduler.in_flight == {}
+    # a later stream is downloaded again
+    assert await consume() == [1, 2]
+    assert downloads == 2
@@ -0,0 +1,57 @@
+"""
+Tests for reading Powershaper export files.
+
+Authored by Robert Sahakyan
+"""
+from datetime import datetime, timedelta, timezone
+import json
+from .. import bulk_import
+from ..const import IMPORT_FILE_BATCH_ROWS
+
+FIELDS = ("energy_kwh", "carbon_kg")
+
+
+def read_all(path) -> list:
+    """Return every batch read from an export file."""
+    reader = bulk_import.ExportReader(str(path), FIELDS)
+    reader.open()
+    batches = []
+    try:
+        while len(batch := reader.read_batch()):
+            batches.append(batch)
+    finally:
+        reader.close()
+    return batches
+
+
+def test_read_csv_export_in_batches(tmp_path):
+    """Test a CSV export is read in bounded batches that carry on from each other."""
+    path = tmp_path / "export.csv"
+    hours = IMPORT_FILE_BATCH_ROWS + 10
+    with open(path, "w") as export:
+        export.write("timestamp,energy_kwh,carbon_kg\n")
+        for hour in range(hours):
+            timestamp = datetime(1970, 1, 1, tzinfo=timezone.utc) + timedelta(hours=hour)
+            export.write(f"{timestamp.isoformat(sep=' ')},1.5,0.5\n")
+        # a repeated row is skipped
+        export.write("1970-01-01 00:00:00+00:00,9,9\n")
+
+    batches = read_all(path)
+
+    assert [len(batch) for batch in batches] == [IMPORT_FILE_BATCH_ROWS, 10]
+    assert batches[1].first_hour == IMPORT_FILE_BATCH_ROWS
+    assert batches[0].total("energy_kwh") == 1.5 * IMPORT_FILE_BATCH_ROWS
+
+
+def test_read_json_export(tmp_path):
+    """Test a JSON export is read as the API response it mirrors."""
+    path = tmp_path / "export.json"
+    path.write_text(json.dumps([
+        {"time": "2023-01-01T00:00:00Z", "energy_kwh": 1.0, "carbon_kg": 0.2},
+        {"time": "2023-01-01T01:00:00Z", "energy_kwh": 2.0, "carbon_kg": 0.4},
+    ]))
+
+    batches = read_all(path)
+
+    assert sum(len(batch) for batch in batches) == 2
+    assert batches[-1].last_timestamp == "2023-01-01T01:00:00Z"
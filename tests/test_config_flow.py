@@ -1,6 +1,8 @@
+from aiohttp.web import HTTPForbidden
 from homeassistant.core import HomeAssistant
 import pytest
-from .. import config_flow
+from .. import api, config_flow
+from ..const import API_TOKEN_LENGTH, DATA_SHARED
 
 
 @pytest.mark.asyncio
@@ -12,3 +14,17 @@ async def test_async_validate_api_token(hass: HomeAssistant):
         await config_flow.async_validate_api_token(hass, invalid_user_input)
 
 # More test coverage to add
+
+
+@pytest.mark.asyncio
+async def test_async_validate_api_token_forbidden(hass: HomeAssistant, monkeypatch):
+    """Test a token the API refuses raises HTTPForbidden, without a scheduler kept for it."""
+
+    async def forbidden(self, url, handler, max_retries):
+        raise api.ApiError(403, url)
+
+    monkeypatch.setattr(api.RequestScheduler, "async_request", forbidden)
+    with pytest.raises(HTTPForbidden):
+        await config_flow.async_validate_api_token(hass, {'api_token': "0" * API_TOKEN_LENGTH})
+
+    assert hass.data[DATA_SHARED].get("request_schedulers", {}) == {}
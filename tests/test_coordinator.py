@@ -0,0 +1,76 @@
+"""
+Tests for importing meter series into the recorder.
+
+Authored by Robert Sahakyan
+"""
+from datetime import datetime, timezone
+from homeassistant.components.recorder import get_instance
+from homeassistant.components.recorder.statistics import statistics_during_period
+from homeassistant.core import HomeAssistant
+import pytest
+from pytest_homeassistant_custom_component.components.recorder.common import async_wait_recording_done
+from .. import coordinator
+from ..const import SENSOR_TYPE_GAS
+from ..sensor import GasMeter
+from ..series import MeterSeries
+
+
+def hourly_points(day, values):
+    """Return data points for the hours of a day in January 2021."""
+    return [{"time": f"2021-01-{day:02d}T{hour:02d}:00:00Z", "energy_kwh": value}
+            for hour, value in enumerate(values)]
+
+
+async def async_sums(hass: HomeAssistant, statistic_id: str) -> list[float]:
+    """Return the hourly sums the recorder holds for a statistic."""
+    statistics = await get_instance(hass).async_add_executor_job(
+        statistics_during_period, hass, datetime(2021, 1, 1, tzinfo=timezone.utc), None,
+        {statistic_id}, "hour", None, {"sum"})
+    return [row["sum"] for row in statistics[statistic_id]]
+
+
+@pytest.mark.asyncio
+async def test_reimport_changed_days_adjusts_later_sums(recorder_mock, hass: HomeAssistant):
+    """Test a day revised upstream is re-imported and the sums of the days after it are shifted."""
+    meter = coordinator.PowershaperMeter("consent", SENSOR_TYPE_GAS, "0" * 40, "2021-01-01", "2021-01-03")
+    meter_coordinator = coordinator.PowershaperCoordinator(hass, "entry", [meter])
+    sensor = GasMeter(meter_coordinator, meter, {}, SENSOR_TYPE_GAS)
+
+    imported = MeterSeries.from_points(
+        hourly_points(1, [1.0] * 24) + hourly_points(2, [2.0] * 24), meter.fields)
+    await coordinator.async_import_new_data(hass, sensor, imported)
+    await async_wait_recording_done(hass)
+    assert (await async_sums(hass, sensor.statistic_id))[-1] == 72.0
+
+    revised = MeterSeries.from_points(
+        hourly_points(1, [1.0] * 23 + [3.0]) + hourly_points(2, [2.0] * 24), meter.fields)
+    day = imported.first_hour // 24
+    revised_days = await coordinator.async_reimport_changed_days(hass, meter, revised, day, day + 1)
+    await async_wait_recording_done(hass)
+
+    assert revised_days == {day}
+    assert sensor.sum == 74.0
+    sums = await async_sums(hass, sensor.statistic_id)
+    assert sums[23] == 26.0
+    assert sums[-1] == 74.0
+
+
+@pytest.mark.asyncio
+async def test_update_meter_without_data_backfills_again(recorder_mock, hass: HomeAssistant, monkeypatch):
+    """Test a meter whose backfill found no data is backfilled again rather than polled from no hour."""
+    backfills = 0
+
+    async def async_fetch_nothing(hass, meter, sensors, progress_callback=None):
+        nonlocal backfills
+        backfills += 1
+
+    monkeypatch.setattr(coordinator, "async_fetch_historic_data", async_fetch_nothing)
+    meter = coordinator.PowershaperMeter("consent", SENSOR_TYPE_GAS, "0" * 40, "2021-01-01", "2021-01-03")
+    meter_coordinator = coordinator.PowershaperCoordinator(hass, "entry", [meter])
+    sensor = GasMeter(meter_coordinator, meter, {}, SENSOR_TYPE_GAS)
+
+    await meter_coordinator.async_update_meter(meter)
+    assert sensor.initialized and meter.latest_timestamp is None
+
+    await meter_coordinator.async_update_meter(meter)
+    assert backfills == 2
@@ -0,0 +1,57 @@
+"""
+Tests for the columnar export files.
+
+Authored by Robert Sahakyan
+"""
+import os
+from .. import export
+from ..series import MeterSeries
+
+FIELDS = ("energy_kwh", "carbon_kg")
+
+
+def make_series(first_hour: int, hours: int) -> MeterSeries:
+    """Return an hourly series whose values are the offset of each hour."""
+    series = MeterSeries(FIELDS)
+    for offset in range(hours):
+        series.append(first_hour + offset, {"energy_kwh": float(offset), "carbon_kg": 0.5})
+    return series
+
+
+def test_export_appends_and_reads_slices(tmp_path):
+    """Test an export written, appended to in place and read back by memory-mapping."""
+    path = os.path.join(tmp_path, "meter" + export.EXPORT_SUFFIX)
+    series = make_series(1000, 48)
+    first = series.slice(0, 24)
+
+    assert export.sync_export(path, first) == 24
+    size = os.path.getsize(path)
+    assert export.sync_export(path, series) == 24
+    assert export.sync_export(path, series) == 0
+    # appended within the free slots, the file was not rewritten
+    assert os.path.getsize(path) == size
+
+    with export.ColumnarReader(path) as reader:
+        assert len(reader) == 48
+        assert reader.fields == FIELDS
+        sliced = reader.slice(1010, 1029)
+        assert list(sliced["hours"]) == list(range(1010, 1030))
+        assert list(sliced["energy_kwh"]) == [float(offset) for offset in range(10, 30)]
+        assert list(reader.column("energy_kwh_cumulative")) == list(series.cumulative["energy_kwh"])
+        assert reader.total("energy_kwh", 1010, 1029) == sum(range(10, 30))
+        assert reader.total("carbon_kg", 2000, 3000) == 0.0
+
+
+def test_export_rewritten_when_full(tmp_path, monkeypatch):
+    """Test an export is rewritten once new hours no longer fit in its free slots."""
+    monkeypatch.setattr(export, "EXPORT_HEADROOM_HOURS", 10)
+    path = os.path.join(tmp_path, "meter" + export.EXPORT_SUFFIX)
+    series = make_series(1000, 48)
+
+    export.sync_export(path, series.slice(0, 24))
+    assert export.append_export(path, series) is None
+    assert export.sync_export(path, series) == 48
+
+    with export.ColumnarReader(path) as reader:
+        assert list(reader.column("hours")) == list(series.hours)
+        assert reader.header.capacity == 58
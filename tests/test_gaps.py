@@ -0,0 +1,32 @@
+"""
+Tests for the gap index of imported hours.
+
+Authored by Robert Sahakyan
+"""
+from .. import gaps
+
+
+def test_gap_index_finds_missing_ranges():
+    """Test the hours never marked between the first and last imported hour are reported as gaps."""
+    index = gaps.GapIndex(1000)
+    index.mark(range(1000, 1010))
+    index.mark([1012, 1013, 1020])
+
+    assert index.gap_count == 8
+    assert index.missing_ranges() == [(1010, 1011), (1014, 1019)]
+
+    index.mark_range(1010, 1019)
+    assert index.gap_count == 0
+    assert index.missing_ranges() == []
+
+
+def test_gap_index_round_trip():
+    """Test the index survives being stored, bits set across many bytes included."""
+    index = gaps.GapIndex(5)
+    index.mark_range(5, 5000)
+    index.mark_range(5100, 5200)
+
+    restored = gaps.GapIndex.from_dict(index.as_dict())
+
+    assert (restored.first, restored.last) == (5, 5200)
+    assert restored.missing_ranges() == [(5001, 5099)]
@@ -0,0 +1,34 @@
+"""
+Tests for setting up and unloading the config entries of the integration.
+
+Authored by Robert Sahakyan
+"""
+from homeassistant.core import HomeAssistant
+import pytest
+from pytest_homeassistant_custom_component.common import MockConfigEntry
+from .. import api, async_unload_entry
+from ..const import DATA_SHARED, DOMAIN
+
+API_TOKEN = "0" * 40
+
+
+@pytest.mark.asyncio
+async def test_unload_keeps_scheduler_until_last_entry_of_token(hass: HomeAssistant, monkeypatch):
+    """Test the request scheduler of a token is only dropped with the last loaded entry using it."""
+    entries = [MockConfigEntry(domain=DOMAIN, data={"api_token": API_TOKEN}) for _ in range(2)]
+    for entry in entries:
+        entry.add_to_hass(hass)
+        hass.data.setdefault(DOMAIN, {})[entry.entry_id] = {"api_token": API_TOKEN}
+    scheduler = api.async_get_request_scheduler(hass, API_TOKEN)
+
+    async def unload_platforms(entry, platforms):
+        return True
+
+    monkeypatch.setattr(hass.config_entries, "async_unload_platforms", unload_platforms)
+
+    assert await async_unload_entry(hass, entries[0])
+    assert api.async_get_request_scheduler(hass, API_TOKEN) is scheduler
+
+    assert await async_unload_entry(hass, entries[1])
+    assert hass.data[DOMAIN] == {}
+    assert API_TOKEN not in hass.data[DATA_SHARED]["request_schedulers"]
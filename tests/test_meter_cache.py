@@ -0,0 +1,36 @@
+"""
+Tests for the meters cached in the Powershaper config entry.
+
+Authored by Robert Sahakyan
+"""
+from datetime import timedelta
+from homeassistant.util import dt as dt_util
+from pytest_homeassistant_custom_component.common import MockConfigEntry
+from .. import meter_cache
+from ..const import CONF_METERS, CONF_METERS_UPDATED, DOMAIN, METERS_CACHE_TTL
+
+METERS_RESPONSE = [{
+    "consent_uuid": "0a1b2c3d-0000-4000-8000-000000000000",
+    "type": "gas",
+    "range": {"earliest": "2021-01-01T00:00:00Z", "latest": "2023-01-01T00:00:00Z"},
+    "address": "not needed by the sensors",
+}]
+
+
+def test_entry_data_with_meters_keeps_what_sensors_need():
+    """Test only the consent, type and range of a meter are cached, next to the token."""
+    data = meter_cache.entry_data_with_meters({"api_token": "0" * 40}, METERS_RESPONSE)
+
+    assert data["api_token"] == "0" * 40
+    assert data[CONF_METERS] == [{key: METERS_RESPONSE[0][key] for key in ("consent_uuid", "type", "range")}]
+
+
+def test_meters_cache_expired():
+    """Test entries without meters or with meters older than the TTL are refreshed."""
+    data = meter_cache.entry_data_with_meters({"api_token": "0" * 40}, METERS_RESPONSE)
+
+    assert not meter_cache.meters_cache_expired(MockConfigEntry(domain=DOMAIN, data=data))
+    assert meter_cache.meters_cache_expired(MockConfigEntry(domain=DOMAIN, data={"api_token": "0" * 40}))
+
+    data[CONF_METERS_UPDATED] = (dt_util.utcnow() - METERS_CACHE_TTL - timedelta(minutes=1)).isoformat()
+    assert meter_cache.meters_cache_expired(MockConfigEntry(domain=DOMAIN, data=data))
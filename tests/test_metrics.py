@@ -0,0 +1,37 @@
+"""
+Tests for the Powershaper request and meter metrics.
+
+Authored by Robert Sahakyan
+"""
+from datetime import datetime, timezone
+from .. import metrics
+from ..const import POLL_OUTCOME_ERROR
+
+
+def test_request_metrics_count_calls_and_bytes():
+    """Test responses, failures and throttled calls all count towards the calls of the last hour."""
+    request_metrics = metrics.RequestMetrics()
+    request_metrics.record_response(200, 0.2)
+    request_metrics.record_bytes(1000, 6000)
+    request_metrics.record_response(429, 0.1)
+    request_metrics.record_failure()
+
+    assert request_metrics.calls_per_hour == 3
+    assert request_metrics.requests == 2
+    assert request_metrics.throttled == 1
+    assert request_metrics.failures == 1
+    assert request_metrics.last_bytes == 1000
+    assert request_metrics.as_dict()["bytes_decoded"] == 6000
+    assert abs(request_metrics.average_latency - 0.15) < 1e-9
+
+
+def test_meter_metrics_record_poll_error():
+    """Test the outcome and error of the last poll are kept."""
+    meter_metrics = metrics.MeterMetrics()
+    meter_metrics.record_parse(24, 0.01)
+    meter_metrics.record_poll(POLL_OUTCOME_ERROR, datetime(2023, 1, 1, tzinfo=timezone.utc), ValueError("boom"))
+
+    stored = meter_metrics.as_dict()
+    assert stored["points_parsed"] == 24
+    assert stored["last_poll"] == POLL_OUTCOME_ERROR
+    assert stored["last_error"] == "boom"
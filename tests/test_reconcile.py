@@ -0,0 +1,39 @@
+"""
+Tests for the Powershaper per day digests.
+
+Authored by Robert Sahakyan
+"""
+from .. import reconcile
+from ..series import MeterSeries
+
+
+def hourly_points(day, values):
+    """Return data points for the hours of a day in January 2021."""
+    return [{"time": f"2021-01-{day:02d}T{hour:02d}:00:00Z", "energy_kwh": value}
+            for hour, value in enumerate(values)]
+
+
+def test_digest_index_detects_revised_day():
+    """Test a day revised upstream is detected and later cumulative sums are shifted."""
+    imported = MeterSeries.from_points(
+        hourly_points(1, [1.0] * 24) + hourly_points(2, [2.0] * 24), ["energy_kwh"])
+
+    digests = reconcile.DigestIndex()
+    # import the series in two parts, as polls do
+    digests.record(imported.slice(0, 30), "energy_kwh", 0.0)
+    digests.record(imported.slice(30), "energy_kwh", imported.cumulative["energy_kwh"][29])
+
+    assert digests.changed_days(reconcile.day_digests(imported, "energy_kwh")) == []
+
+    revised = MeterSeries.from_points(
+        hourly_points(1, [1.0] * 23 + [3.0]) + hourly_points(2, [2.0] * 24), ["energy_kwh"])
+    changed = digests.changed_days(reconcile.day_digests(revised, "energy_kwh"))
+    day = imported.first_hour // 24
+
+    assert changed == [day]
+
+    delta = digests.replace_day(
+        day, reconcile.day_digests(revised, "energy_kwh")[day], digests.cumulative_before(day))
+
+    assert delta == 2.0
+    assert digests.days[day + 1][3] == 74.0
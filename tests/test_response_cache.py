@@ -0,0 +1,56 @@
+"""
+Tests for the on-disk response cache.
+
+Authored by Robert Sahakyan
+"""
+from datetime import date
+import os
+from .. import response_cache
+from ..series import MeterSeries
+
+FIELDS = ("energy_kwh", "carbon_kg")
+CONSENT_UUID = "0a1b2c3d-0000-4000-8000-000000000000"
+
+
+def make_series(hours: int) -> MeterSeries:
+    """Return an hourly series of a number of hours from 2023-01-01."""
+    series = MeterSeries(FIELDS)
+    for hour in range(hours):
+        series.append(464256 + hour, {"energy_kwh": hour / 10, "carbon_kg": hour / 100})
+    return series
+
+
+def test_cache_round_trip_and_invalidate(tmp_path):
+    """Test a cached window is read back as it was put, until a revised day inside it is invalidated."""
+    cache = response_cache.ResponseCache(str(tmp_path))
+    window = (CONSENT_UUID, "electricity", "2023-01-01", "2023-02-01", "hour")
+    cache.put(*window, make_series(744))
+
+    cached = cache.get(*window, FIELDS)
+    assert list(cached.hours) == list(make_series(744).hours)
+    assert cached.total("energy_kwh") == make_series(744).total("energy_kwh")
+    # a gas window is another file
+    assert cache.get(CONSENT_UUID, "gas", *window[2:], FIELDS) is None
+
+    assert cache.invalidate(CONSENT_UUID, "electricity", [date(2023, 3, 1)]) == 0
+    assert cache.invalidate(CONSENT_UUID, "electricity", [date(2023, 1, 15)]) == 1
+    assert cache.get(*window, FIELDS) is None
+
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    """Test the least recently used file is evicted once the cache outgrows its size."""
+    cache = response_cache.ResponseCache(str(tmp_path))
+    first = (CONSENT_UUID, "gas", "2023-01-01", "2023-02-01", "hour")
+    second = (CONSENT_UUID, "gas", "2023-02-01", "2023-03-01", "hour")
+    cache.put(*first, make_series(24))
+    cache.max_bytes = os.path.getsize(cache.path(*first)) * 3 // 2
+    cache.put(*second, make_series(24))
+
+    assert cache.get(*first, FIELDS) is None
+    assert cache.get(*second, FIELDS) is not None
+
+
+def test_window_is_closed():
+    """Test only windows that ended long enough ago are cached."""
+    assert response_cache.window_is_closed("2023-01-01", date(2023, 3, 1))
+    assert not response_cache.window_is_closed("2023-02-20", date(2023, 3, 1))
@@ -0,0 +1,36 @@
+"""
+Tests for the Powershaper poll scheduler.
+
+Authored by Robert Sahakyan
+"""
+from datetime import datetime, timezone
+from .. import scheduler
+from ..const import POLL_INTERVAL_DEFAULT, POLL_INTERVAL_DENSE, POLL_INTERVAL_MAX
+
+
+def test_poll_scheduler_backs_off():
+    """Test empty polls back off up to the maximum interval."""
+    poll_scheduler = scheduler.PollScheduler()
+    now = datetime(2023, 1, 1, 12, tzinfo=timezone.utc)
+
+    assert poll_scheduler.next_poll(now) == now + POLL_INTERVAL_DEFAULT
+
+    for _ in range(40):
+        poll_scheduler.record(now, False)
+
+    assert poll_scheduler.next_poll(now) == now + POLL_INTERVAL_MAX
+
+
+def test_poll_scheduler_learns_arrival_hour():
+    """Test polls get dense around the hour new data was seen and wake up for it."""
+    poll_scheduler = scheduler.PollScheduler()
+    for day in range(1, 5):
+        poll_scheduler.record(datetime(2023, 1, day, 6, tzinfo=timezone.utc), True)
+        for _ in range(5):
+            poll_scheduler.record(datetime(2023, 1, day, 12, tzinfo=timezone.utc), False)
+
+    dense = datetime(2023, 1, 5, 6, 10, tzinfo=timezone.utc)
+    assert poll_scheduler.next_poll(dense) == dense + POLL_INTERVAL_DENSE
+
+    sparse = datetime(2023, 1, 5, 2, 30, tzinfo=timezone.utc)
+    assert poll_scheduler.next_poll(sparse) == datetime(2023, 1, 5, 5, tzinfo=timezone.utc)
@@ -0,0 +1,66 @@
+"""
+Tests for the sensors of the meters of an API token.
+
+Authored by Robert Sahakyan
+"""
+from homeassistant.core import HomeAssistant
+import pytest
+from pytest_homeassistant_custom_component.common import MockConfigEntry
+from .. import coordinator, sensor
+from ..const import CONF_PRIMARY_CONSENTS, DOMAIN, SENSOR_TYPE_ELECTRICITY, SENSOR_TYPE_GAS
+
+API_TOKEN = "0" * 40
+FIRST_CONSENT = "bbbbbbbb-0000-4000-8000-000000000000"
+LATER_CONSENT = "aaaaaaaa-0000-4000-8000-000000000000"
+
+
+def make_meter(consent_uuid: str, meter_type: str = SENSOR_TYPE_GAS):
+    """Return a meter with a year of data."""
+    return coordinator.PowershaperMeter(consent_uuid, meter_type, API_TOKEN, "2021-01-01", "2022-01-01")
+
+
+@pytest.mark.asyncio
+async def test_plain_ids_stay_with_the_first_meter(hass: HomeAssistant):
+    """Test a meter listed later whose consent sorts first does not take over the plain statistic ids."""
+    entry = MockConfigEntry(domain=DOMAIN, data={"api_token": API_TOKEN})
+    entry.add_to_hass(hass)
+
+    assert sensor.primary_meter_consents(hass, entry, [make_meter(FIRST_CONSENT)]) == {
+        SENSOR_TYPE_GAS: FIRST_CONSENT}
+
+    meters = [make_meter(LATER_CONSENT), make_meter(FIRST_CONSENT), make_meter(LATER_CONSENT, SENSOR_TYPE_ELECTRICITY)]
+    assert sensor.primary_meter_consents(hass, entry, meters) == {
+        SENSOR_TYPE_GAS: FIRST_CONSENT, SENSOR_TYPE_ELECTRICITY: LATER_CONSENT}
+    assert entry.data[CONF_PRIMARY_CONSENTS][SENSOR_TYPE_GAS] == FIRST_CONSENT
+    assert sensor.consent_suffix(meters, meters[0]) == "_aaaaaaaa"
+
+
+@pytest.mark.asyncio
+async def test_failing_meter_only_makes_its_sensors_unavailable(hass: HomeAssistant):
+    """Test the update of the entry succeeds while one of its meters fails, and fails once all of them do."""
+    failing, working = make_meter(FIRST_CONSENT), make_meter(LATER_CONSENT)
+    meter_coordinator = coordinator.PowershaperCoordinator(hass, "entry", [failing, working])
+    failing_sensor = sensor.GasMeter(meter_coordinator, failing, {}, SENSOR_TYPE_GAS)
+    working_sensor = sensor.GasMeter(meter_coordinator, working, {}, SENSOR_TYPE_GAS, "_aaaaaaaa")
+    failing_meters = {failing}
+
+    async def async_update_meter(meter):
+        if meter in failing_meters:
+            raise coordinator.ApiError(500, "url")
+        for meter_sensor in meter.sensors:
+            meter_sensor.initialized = True
+
+    meter_coordinator.async_update_meter = async_update_meter
+    await meter_coordinator.async_refresh()
+
+    assert meter_coordinator.last_update_success
+    assert working_sensor.available
+    assert not failing_sensor.available
+
+    failing_meters.add(working)
+    for meter in meter_coordinator.meters:
+        meter.next_poll = None
+    await meter_coordinator.async_refresh()
+
+    assert not meter_coordinator.last_update_success
+    assert not working_sensor.available
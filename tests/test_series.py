@@ -0,0 +1,34 @@
+"""
+Tests for the Powershaper meter series.
+
+Authored by Robert Sahakyan
+"""
+from .. import series as meter_series
+
+
+def test_meter_series_statistics():
+    """Test the cumulative sums of a series carry on from the base sum and survive slicing."""
+    data = [{"time": f"2021-01-01T{hour:02d}:00:00Z", "energy_kwh": 1.0, "carbon_kg": 0.5}
+            for hour in range(6)]
+    series = meter_series.MeterSeries.from_points(
+        data + data[:2], ["energy_kwh", "carbon_kg"])
+
+    assert len(series) == 6
+    assert series.total("energy_kwh") == 6.0
+    assert series.last_timestamp == "2021-01-01T05:00:00Z"
+
+    newer = series.after(meter_series.timestamp_to_hour("2021-01-01T03:00:00Z"))
+    statistics = list(newer.statistics("carbon_kg", 10.0))
+
+    assert [statistic["sum"] for statistic in statistics] == [10.5, 11.0]
+    assert statistics[0]["start"] == meter_series.hour_to_datetime(
+        meter_series.timestamp_to_hour("2021-01-01T04:00:00Z"))
+
+
+def test_points_after_skips_known_points():
+    """Test only the points newer than a timestamp are returned from a response."""
+    points = [{"time": f"2023-01-01T{hour:02d}:00:00Z", "energy_kwh": 1.0} for hour in range(24)]
+
+    assert meter_series.points_after(points, "2023-01-01T20:00:00Z") == points[21:]
+    assert meter_series.points_after(points, "2022-12-31T23:00:00Z") is points
+    assert meter_series.points_after(points, "2023-01-02T00:00:00Z") == []
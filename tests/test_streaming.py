@@ -0,0 +1,32 @@
+"""
+Tests for the Powershaper streaming JSON decoder.
+
+Authored by Robert Sahakyan
+"""
+import json
+import pytest
+from .. import streaming
+
+
+def test_json_array_decoder_chunks():
+    """Test items split across any chunk boundary are decoded once complete."""
+    data = [{"time": f"2021-01-01T{hour:02d}:00:00Z", "energy_kwh": hour / 10}
+            for hour in range(24)]
+    raw = json.dumps(data).encode()
+
+    for chunk_size in [1, 13, len(raw)]:
+        decoder = streaming.JsonArrayDecoder()
+        items = []
+        for position in range(0, len(raw), chunk_size):
+            items.extend(decoder.feed(raw[position:position + chunk_size]))
+        decoder.close()
+        assert items == data
+
+
+def test_json_array_decoder_invalid():
+    """Test a ValueError is raised for responses that are not a complete JSON array."""
+    for raw in [b'{"detail": "Invalid token."}', b'[{"time": "2021-01-01T00:00:00Z"}']:
+        decoder = streaming.JsonArrayDecoder()
+        with pytest.raises(ValueError):
+            decoder.feed(raw)
+            decoder.close()
@@ -0,0 +1,27 @@
+"""
+Tests for the Powershaper timestamp parser.
+
+Authored by Robert Sahakyan
+"""
+from datetime import datetime, timezone
+import pytest
+from .. import timestamps
+
+
+def test_parse_timestamp_matches_strptime():
+    """Test the fast path returns the same datetime as strptime."""
+    for timestamp in ["2021-01-01T00:00:00Z", "2020-02-29T23:00:00Z", "2022-12-31T13:00:00Z"]:
+        expected = datetime.strptime(
+            timestamp, '%Y-%m-%dT%H:%M:%SZ').replace(tzinfo=timezone.utc)
+        assert timestamps.parse_timestamp(timestamp) == expected
+        assert timestamps.parse_epoch(timestamp) == int(expected.timestamp())
+
+
+def test_parse_timestamp_irregular():
+    """Test timestamps off the hour fall back to strict parsing and invalid ones are rejected."""
+    assert timestamps.parse_timestamp("2021-06-01T10:30:15Z") == datetime(
+        2021, 6, 1, 10, 30, 15, tzinfo=timezone.utc)
+
+    for invalid in ["2021-02-30T10:00:00Z", "2021-01-01T24:00:00Z", "2021-01-01 10:00:00"]:
+        with pytest.raises(ValueError):
+            timestamps.parse_timestamp(invalid)
@@ -0,0 +1,44 @@
+"""
+Tests for the usage index of imported hours.
+
+Authored by Robert Sahakyan
+"""
+from datetime import datetime, timedelta, timezone
+from .. import usage
+from ..series import MeterSeries
+
+UTC = timezone.utc
+
+
+def make_series(first_hour: int, hours: int, value: float = 1.0) -> MeterSeries:
+    """Return an hourly series of a constant value."""
+    series = MeterSeries(("energy_kwh",))
+    for hour in range(first_hour, first_hour + hours):
+        series.append(hour, {"energy_kwh": value})
+    return series
+
+
+def test_usage_index_totals_and_rollups():
+    """Test range totals and daily rollups over an index extended by polls and a revised day."""
+    first_hour = int(datetime(2023, 1, 1, tzinfo=UTC).timestamp()) // 3600
+    index = usage.UsageIndex(("energy_kwh",))
+    index.extend(make_series(first_hour, 48))
+    index.extend(make_series(first_hour + 40, 24))
+    index.replace(make_series(first_hour + 24, 24, 2.0))
+
+    start = datetime(2023, 1, 1, 12, tzinfo=UTC)
+    assert index.total("energy_kwh", start, start + timedelta(hours=24)) == 12 + 12 * 2.0
+    assert index.total("energy_kwh", start, start) == 0.0
+
+    rollup = index.rollup(["energy_kwh"], datetime(2023, 1, 1, tzinfo=UTC), datetime(2023, 1, 4, tzinfo=UTC),
+                          usage.PERIOD_DAY, UTC)
+    assert [totals["energy_kwh"] for _, totals in rollup] == [24.0, 48.0, 16.0]
+
+
+def test_period_starts_months():
+    """Test monthly periods start on the first of each month, the first one clipped to the start."""
+    starts = usage.period_starts(datetime(2023, 11, 15, tzinfo=UTC), datetime(2024, 2, 1, tzinfo=UTC),
+                                 usage.PERIOD_MONTH, UTC)
+
+    assert starts == [datetime(2023, 11, 15, tzinfo=UTC), datetime(2023, 12, 1, tzinfo=UTC),
+                      datetime(2024, 1, 1, tzinfo=UTC)]
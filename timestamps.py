@@ -0,0 +1,65 @@
+"""
+timestamps.py - fast parsing of the hourly UTC timestamps returned by the Powershaper API
+
+Authored by Robert Sahakyan
+"""
+
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+
+TIMESTAMP_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_HOURS = [timedelta(hours=hour) for hour in range(24)]
+
+
+@lru_cache(maxsize=1024)
+def _day_start(day: str) -> datetime:
+    """Return midnight UTC of a YYYY-MM-DD day, cached as an hourly series repeats each day 24 times."""
+    return datetime.strptime(day, '%Y-%m-%d').replace(tzinfo=timezone.utc)
+
+
+def _hour(timestamp: str) -> int:
+    """Return the hour of a timestamp on the hour (YYYY-MM-DDTHH:00:00Z), or -1 for anything irregular."""
+    if len(timestamp) != 20 or timestamp[10] != 'T' or timestamp[13:] != ':00:00Z':
+        return -1
+
+    tens, units = timestamp[11], timestamp[12]
+    if not ('0' <= tens <= '2' and '0' <= units <= '9'):
+        return -1
+
+    hour = (ord(tens) - 48) * 10 + ord(units) - 48
+    return hour if hour < 24 else -1
+
+
+def parse_timestamp(timestamp: str) -> datetime:
+    """Parse a Powershaper timestamp (YYYY-MM-DDTHH:MM:SSZ) into an aware UTC datetime.
+
+    Timestamps on the hour take a fast path of a cached day plus an hour offset,
+    anything else falls back to a strict strptime.
+    """
+    hour = _hour(timestamp)
+    if hour >= 0:
+        return _day_start(timestamp[:10]) + _HOURS[hour]
+
+    return datetime.strptime(timestamp, TIMESTAMP_FORMAT).replace(tzinfo=timezone.utc)
+
+
+def parse_epoch(timestamp: str) -> int:
+    """Parse a Powershaper timestamp (YYYY-MM-DDTHH:MM:SSZ) into unix seconds."""
+    hour = _hour(timestamp)
+    if hour >= 0:
+        return _day_epoch(timestamp[:10]) + hour * 3600
+
+    return int((parse_timestamp(timestamp) - _EPOCH).total_seconds())
+
+
+@lru_cache(maxsize=1024)
+def _day_epoch(day: str) -> int:
+    """Return the unix time of midnight UTC of a YYYY-MM-DD day."""
+    return int((_day_start(day) - _EPOCH).total_seconds())
+
+
+def format_timestamp(value: datetime) -> str:
+    """Format an aware datetime as a Powershaper timestamp (YYYY-MM-DDTHH:MM:SSZ)."""
+    return value.astimezone(timezone.utc).strftime(TIMESTAMP_FORMAT)
@@ -0,0 +1,133 @@
+"""
+usage.py - an index of the hourly usage imported for a meter, answering range totals and rollups by binary search
+
+Authored by Robert Sahakyan
+"""
+
+from datetime import datetime, timedelta, tzinfo
+import logging
+import os
+import tempfile
+import zlib
+from typing import Iterable
+from homeassistant.helpers.storage import STORAGE_DIR
+from .const import DOMAIN
+from .series import MeterSeries
+
+_LOGGER = logging.getLogger(__name__)
+
+PERIOD_DAY = "day"
+PERIOD_MONTH = "month"
+
+
+def first_hour_from(value: datetime) -> int:
+    """Return the first epoch hour starting at or after an aware datetime."""
+    return -int(-value.timestamp() // 3600)
+
+
+def period_starts(start: datetime, end: datetime, period: str, time_zone: tzinfo) -> list[datetime]:
+    """Return the starts of the days or months (in a time zone) overlapping start -> end, clipped to start."""
+    local = start.astimezone(time_zone)
+    boundary = datetime(local.year, local.month, 1 if period == PERIOD_MONTH else local.day, tzinfo=time_zone)
+    starts = [start]
+
+    while True:
+        if period == PERIOD_MONTH:
+            boundary = datetime(boundary.year + boundary.month // 12, boundary.month % 12 + 1, 1, tzinfo=time_zone)
+        else:
+            # through the date, so a day is 23 or 25 hours long across a DST change
+            next_day = boundary.date() + timedelta(days=1)
+            boundary = datetime(next_day.year, next_day.month, next_day.day, tzinfo=time_zone)
+        if boundary >= end:
+            return starts
+        starts.append(boundary)
+
+
+class UsageIndex:
+    """The hours imported for a meter with the cumulative sum of every field, kept up to date on every import.
+
+    Totals over any range take two binary searches into the cumulative sums, whatever the length of the range.
+    """
+
+    def __init__(self, fields: Iterable[str], series: MeterSeries = None):
+        """Initialize the index, optionally with the series it was saved with."""
+        self.series = series if series is not None else MeterSeries(fields)
+        self.changed = False
+
+    def __len__(self) -> int:
+        """Return the number of hours in the index."""
+        return len(self.series)
+
+    def extend(self, series: MeterSeries) -> None:
+        """Add the hours of a series newer than the last indexed hour."""
+        length = len(self.series)
+        self.series.extend_series(series)
+        self.changed |= len(self.series) != length
+
+    def replace(self, series: MeterSeries) -> None:
+        """Replace the hours covered by a series, e.g. a re-imported day."""
+        self.series.replace_hours(series)
+        self.changed = True
+
+    def clear(self) -> None:
+        """Forget every hour, e.g. before a full re-import."""
+        self.series = MeterSeries(self.series.fields)
+        self.changed = True
+
+    def total(self, field: str, start: datetime, end: datetime) -> float:
+        """Return the sum of a field over the hours starting from start up to, not including, end."""
+        return self.series.total_between(field, first_hour_from(start), first_hour_from(end) - 1)
+
+    def rollup(self, fields: Iterable[str], start: datetime, end: datetime, period: str,
+               time_zone: tzinfo) -> list[tuple[datetime, dict[str, float]]]:
+        """Return the totals of some fields for every day or month (in a time zone) of start -> end."""
+        starts = period_starts(start, end, period, time_zone)
+        return [(period_start, {field: self.total(field, period_start, period_end) for field in fields})
+                for period_start, period_end in zip(starts, starts[1:] + [end])]
+
+    def save(self, path: str) -> None:
+        """Write the index to a file, blocking."""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        descriptor, temporary = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(descriptor, "wb") as saved:
+            saved.write(zlib.compress(self.series.to_bytes(), 1))
+        os.replace(temporary, path)
+        self.changed = False
+
+    @classmethod
+    def load(cls, path: str, fields: Iterable[str]) -> "UsageIndex":
+        """Read an index saved to a file, an empty index if there is none or it lacks a field, blocking."""
+        try:
+            with open(path, "rb") as saved:
+                series = MeterSeries.from_bytes(zlib.decompress(saved.read()))
+        except FileNotFoundError:
+            return cls(fields)
+        except (OSError, ValueError, zlib.error) as ex:
+            _LOGGER.warning(f"Unable to read the usage index {path}, it is rebuilt from new imports: {ex}")
+            return cls(fields)
+
+        if not set(fields) <= set(series.fields):
+            return cls(fields)
+        return cls(fields, series)
+
+
+def usage_directory(hass) -> str:
+    """Return the directory the usage indexes are saved in."""
+    return hass.config.path(STORAGE_DIR, f"{DOMAIN}_usage")
+
+
+def usage_path(hass, entry_id: str, meter_key: str) -> str:
+    """Return the file of the usage index of a meter of a config entry."""
+    return os.path.join(usage_directory(hass), f"{entry_id}_{meter_key}.usage.z")
+
+
+def remove_usage(hass, entry_id: str) -> None:
+    """Remove the usage indexes of a config entry, blocking."""
+    directory = usage_directory(hass)
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return
+    for name in names:
+        if name.startswith(f"{entry_id}_"):
+            os.remove(os.path.join(directory, name))